@@ -0,0 +1,118 @@
+"""
+The inputs each benchmark runs over. Every corpus is generated from a fixed seed, so runs are comparable.
+"""
+import random
+from typing import Callable, Dict, List
+
+__all__ = "CORPORA", "PLOTTED"
+
+_OPS = "+-*/"
+_OP_WEIGHTS = (4, 4, 1, 1) # keeps results inside the limits
+
+
+def _number(rng: random.Random) -> str:
+    if rng.random() < 0.3:
+        return f"{rng.randint(1, 99)}.{rng.randint(1, 99)}"
+
+    return str(rng.randint(1, 99))
+
+
+def _op(rng: random.Random) -> str:
+    return rng.choices(_OPS, _OP_WEIGHTS)[0]
+
+
+def arithmetic(rng: random.Random) -> List[str]:
+    inputs = []
+    for _ in range(200):
+        terms = [_number(rng) for _ in range(rng.randint(5, 30))]
+        inputs.append("".join(t + _op(rng) for t in terms[:-1]) + terms[-1])
+
+    return inputs
+
+
+def nested_brackets(rng: random.Random) -> List[str]:
+    inputs = []
+    for _ in range(50):
+        exp = _number(rng)
+        for _ in range(rng.randint(20, 60)):
+            exp = f"({exp}{rng.choice('+-')}{_number(rng)})"
+
+        inputs.append(exp)
+
+    return inputs
+
+
+def implicit_multiplication(rng: random.Random) -> List[str]:
+    inputs = []
+    for _ in range(200):
+        parts = [rng.choice(["2pi", f"{_number(rng)}({_number(rng)}+1)", "(3)(4)", "2E", "3(2)pi"]) for _ in range(rng.randint(2, 8))]
+        inputs.append("+".join(parts))
+
+    return inputs
+
+
+def functions(rng: random.Random) -> List[str]:
+    inputs = []
+    for _ in range(100):
+        a, b = rng.randint(1, 9), rng.randint(1, 9)
+        inputs.append(
+            f"p(x)=x^2+{a}x+{b}\n"
+            f"q(x,y)=p(x)*{a}+p(y)/{b}\n"
+            f"r(x)=q(x,x+1)-sin(rad(x))\n"
+            f"r({rng.randint(1, 9)})+q({a},{b})+p(p({b}))"
+        )
+
+    return inputs
+
+
+def sequences(rng: random.Random) -> List[str]:
+    inputs = []
+    for _ in range(100):
+        first, ratio = rng.randint(1, 9), rng.randint(2, 5)
+        n = rng.randint(2, 8)
+        term = first * ratio ** (n - 1)
+        inputs.append(f"S={first},{first * ratio}\nS({n})\nS?({term})\nS!({n})\nS!!({term})")
+
+    return inputs
+
+
+def plotted(rng: random.Random) -> List[str]:
+    inputs = []
+    for _ in range(50):
+        a, b = rng.randint(1, 9), rng.randint(1, 9)
+        inputs.append(rng.choice([
+            f"y=x^2+{a}x+{b}",
+            f"p(x)=sin(x)*{a}\ny=p(x)+x/{b}",
+            f"y=({a}x-{b})(x+{a})",
+        ]))
+
+    return inputs
+
+
+def multiline(rng: random.Random) -> List[str]:
+    lines = ["p(x)=x*3+1", "q(x)=p(x)^2"]
+    for _ in range(2000):
+        lines.append(rng.choice([
+            f"{_number(rng)}*{_number(rng)}+{_number(rng)}",
+            f"p({rng.randint(1, 99)})",
+            f"q({rng.randint(1, 9)})-p(2)",
+            f"({_number(rng)}+{_number(rng)})({_number(rng)})",
+        ]))
+
+    return ["\n".join(lines)]
+
+
+_GENERATORS: Dict[str, Callable[[random.Random], List[str]]] = {
+    "arithmetic": arithmetic,
+    "nested_brackets": nested_brackets,
+    "implicit_multiplication": implicit_multiplication,
+    "functions": functions,
+    "sequences": sequences,
+    "plotted": plotted,
+    "multiline": multiline,
+}
+
+CORPORA: Dict[str, List[str]] = {name: gen(random.Random(name)) for name, gen in _GENERATORS.items()}
+
+# corpora whose expressions produce graphs, and so can be rendered
+PLOTTED = ("plotted",)
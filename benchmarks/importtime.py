@@ -0,0 +1,138 @@
+"""
+Times ``import mathparser`` in fresh interpreters, for guarding cold start latency.
+
+    python -m benchmarks.importtime                            # printed
+    python -m benchmarks.importtime --output importtime.json   # ... and saved, machine readable
+    python -m benchmarks.importtime --baseline importtime.json # exits with 1 if importing got slower
+
+Each sample is the wall time of ``python -c "import mathparser"`` less that of ``python -c "pass"``, so interpreter
+startup isn't counted. The run also fails if the import had side effects it shouldn't: loading the modules in
+``MUST_NOT_IMPORT``, starting threads or creating files.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import mathparser
+
+# modules that are only needed by optional features, and are slow to import
+MUST_NOT_IMPORT = (
+    "asyncio",
+    "concurrent.futures",
+    "multiprocessing",
+    "mathparser.graph",
+    "mathparser.aio",
+    "mathparser.bulk",
+    "mathparser.serialize",
+)
+
+_CHECK = """
+import os, sys, threading
+before = set(os.listdir({package!r}))
+import mathparser
+print(sorted(m for m in {modules!r} if m in sys.modules))
+print(threading.active_count() - 1)
+print(sorted(set(os.listdir({package!r})) - before))
+"""
+
+
+def _run(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, env=_env())
+    return time.perf_counter() - start
+
+
+def _env() -> Dict[str, str]:
+    # the child must import the same mathparser as this process
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(mathparser.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure(repeat: int) -> Dict:
+    _run("import mathparser") # writes any missing bytecode, so every sample is a warm disk cache
+
+    samples = []
+    for _ in range(repeat):
+        empty = _run("pass")
+        samples.append(_run("import mathparser") - empty)
+
+    return {"min": min(samples), "median": statistics.median(samples), "samples": samples}
+
+
+def side_effects() -> List[str]:
+    """
+    Imports mathparser in a fresh interpreter, returning a description of everything it did that it shouldn't have.
+    """
+    package = os.path.dirname(os.path.abspath(mathparser.__file__))
+    code = _CHECK.format(package=package, modules=MUST_NOT_IMPORT)
+    out = subprocess.run([sys.executable, "-c", code], check=True, env=_env(), capture_output=True, text=True)
+    modules, threads, files = out.stdout.splitlines()
+
+    problems = []
+    if modules != "[]":
+        problems.append(f"imported {modules}")
+    if threads != "0":
+        problems.append(f"started {threads} thread(s)")
+    if files != "[]":
+        problems.append(f"created {files} in the package")
+
+    return problems
+
+
+def main(argv: List[str]=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.importtime", description="mathparser import time")
+    parser.add_argument("--repeat", type=int, default=20, help="samples to take")
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="a previous --output to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown (as a fraction) counted as a regression")
+    args = parser.parse_args(argv)
+
+    result = measure(args.repeat)
+    problems = side_effects()
+
+    change = ""
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            old = json.load(f)["result"]
+
+        result["change"] = result["median"] / old["median"] - 1
+        regressed = result["change"] > args.threshold
+        change = f" ({result['change']:+.1%}{' !' if regressed else ''})"
+
+    print(f"import mathparser: median {result['median'] * 1e3:.1f}ms, min {result['min'] * 1e3:.1f}ms{change}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "mathparser": mathparser.__version__,
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "time": time.time(),
+            },
+            "result": result,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for problem in problems:
+        print(f"import mathparser {problem}", file=sys.stderr)
+
+    if regressed:
+        print(f"\nimporting regressed by more than {args.threshold:.0%}", file=sys.stderr)
+
+    return 1 if regressed or problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Runs the benchmark suite and optionally compares it against a saved baseline.
+
+    python -m benchmarks.run                              # every corpus, printed as a table
+    python -m benchmarks.run --output results.json        # ... and saved, machine readable
+    python -m benchmarks.run --baseline results.json      # exits with 1 if anything got slower
+    python -m benchmarks.run --corpus functions --stage execute --stage parse
+
+Each stage is timed separately over a whole corpus: ``tokenize`` (MathLexer.tokenize), ``parse`` (Parser.parse,
+from already lexed tokens, including the optimizer), ``execute`` (Expression.execute, on inputs parsed with
+``optimize=False``), ``optimized`` (the same, on inputs parsed with the optimizer) and ``plot`` (graph.plot,
+from already evaluated points, with the render cache disabled). Constant folding reduces many inputs to a single
+constant, so ``execute`` is what measures the evaluator, and the two side by side show what the optimizer saves.
+``plot`` starts matplotlib workers, so it is only run when asked for.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import mathparser
+from mathparser import graph
+
+from .corpora import CORPORA, PLOTTED
+
+STAGES = ("tokenize", "parse", "execute", "optimized", "plot")
+DEFAULT_STAGES = ("tokenize", "parse", "execute", "optimized")
+
+
+def _prepare(stage: str, inputs: List[str]) -> Optional[Callable[[], None]]:
+    # returns a function running the stage once over every input. everything before the stage happens here, untimed
+    lex = mathparser.MathLexer()
+
+    if stage == "tokenize":
+        def run():
+            for s in inputs:
+                list(lex.tokenize(s))
+
+        return run
+
+    tokens = [list(lex.tokenize(s)) for s in inputs]
+    if stage == "parse":
+        def run():
+            for s, toks in zip(inputs, tokens):
+                mathparser.Parser(s, lex).parse(toks)
+
+        return run
+
+    parsed = []
+    for s, toks in zip(inputs, tokens):
+        parser = mathparser.Parser(s, lex, optimize=stage != "execute")
+        parsed.append((parser, parser.parse(toks)))
+
+    if stage in ("execute", "optimized"):
+        def run():
+            for parser, exprs in parsed:
+                for expr in exprs:
+                    expr.execute(None, parser)
+
+        return run
+
+    points = [expr.execute(None, parser) for parser, exprs in parsed for expr in exprs if expr.plot]
+    if not points:
+        return None
+
+    loop = asyncio.new_event_loop()
+    graph.configure(cache=False)
+
+    def run():
+        for i, p in enumerate(points):
+            loop.run_until_complete(graph.plot(p, i + 1))
+
+    run() # the first render starts and warms the workers
+    return run
+
+
+def measure(stage: str, corpus: str, repeat: int, min_time: float) -> Optional[Dict]:
+    run = _prepare(stage, CORPORA[corpus])
+    if run is None:
+        return None
+
+    # run enough times per sample for the timer to be meaningful
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+
+        if time.perf_counter() - start >= min_time or number >= 1 << 16:
+            break
+
+        number *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+
+        samples.append((time.perf_counter() - start) / number)
+
+    return {
+        "corpus": corpus,
+        "stage": stage,
+        "inputs": len(CORPORA[corpus]),
+        "number": number,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "samples": samples,
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    Marks each result with its change from the baseline (by median), returning the ones slower than ``threshold``.
+    """
+    previous = {(r["corpus"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result["corpus"], result["stage"]))
+        if old is None:
+            continue
+
+        result["change"] = result["median"] / old["median"] - 1
+        if result["change"] > threshold:
+            regressions.append(result)
+
+    return regressions
+
+
+def _print_table(results: List[Dict], threshold: float, out=sys.stdout):
+    print(f"{'corpus':<26}{'stage':<12}{'median':>12}{'min':>12}{'per input':>12}{'change':>10}", file=out)
+    for r in results:
+        change = ""
+        if "change" in r:
+            change = f"{r['change']:+.1%}" + (" !" if r["change"] > threshold else "")
+
+        print(
+            f"{r['corpus']:<26}{r['stage']:<12}{r['median'] * 1e3:>10.3f}ms{r['min'] * 1e3:>10.3f}ms"
+            f"{r['median'] / r['inputs'] * 1e6:>10.1f}us{change:>10}",
+            file=out
+        )
+
+
+def main(argv: List[str]=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="mathparser benchmarks")
+    parser.add_argument("--corpus", action="append", choices=sorted(CORPORA), help="corpora to run (default: all)")
+    parser.add_argument("--stage", action="append", choices=STAGES, help=f"stages to time (default: {', '.join(DEFAULT_STAGES)})")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per sample")
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="a previous --output to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown (as a fraction) counted as a regression")
+    args = parser.parse_args(argv)
+
+    corpora = args.corpus or list(CORPORA)
+    stages = args.stage or DEFAULT_STAGES
+
+    results = []
+    for corpus in corpora:
+        for stage in stages:
+            if stage == "plot" and corpus not in PLOTTED:
+                continue
+
+            result = measure(stage, corpus, args.repeat, args.min_time)
+            if result is not None:
+                results.append(result)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    _print_table(results, args.threshold)
+
+    if args.output:
+        report = {
+            "meta": {
+                "mathparser": mathparser.__version__,
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "time": time.time(),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,36 @@
 from .errors import *
 from .lex import MathLexer
 from .parse import Parser
-from . import graph
+from .plotting import PlotOptions
+from .cache import ParseCache
+from .engine import Engine
 
 __version__ = "0.1.0"
+
+# imported on first use, since they pull in asyncio, multiprocessing or matplotlib's workers,
+# which most processes (and every cold start) would otherwise pay for without using
+_LAZY = {
+    "AsyncEvaluator": (".aio", "AsyncEvaluator"),
+    "BulkEvaluator": (".bulk", "BulkEvaluator"),
+    "graph": (".graph", None),
+    "instrument": (".instrument", None),
+    "serialize": (".serialize", None),
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+    module, attr = _LAZY[name]
+    value = importlib.import_module(module, __name__)
+    if attr is not None:
+        value = getattr(value, attr)
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,20 +1,60 @@
-if __name__ != "__main__":
-    exit(-1)
+import io
+import sys
+import json
+from typing import List, Optional, Tuple, Union
 
-import sys, json
-from matplotlib import pyplot
+pyplot = None
 
-target = sys.argv[1]
-data = json.loads(sys.argv[2])
-kws = data['keys']
-no = data['no']
+def warm():
+    # imports matplotlib once. pooled workers run this as their initializer
+    global pyplot
+    if pyplot is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import pyplot as _pyplot
+        pyplot = _pyplot
 
-fig, ax = pyplot.subplots()
-ax.plot(list(kws.keys()), list(kws.values()))
-ax.grid()
-ax.set(label=f"Graph {no}")
+def render(xs: List[Union[int, float]], ys: List[Optional[Union[int, float]]], no: int) -> bytes:
+    warm()
+    fig, ax = pyplot.subplots()
+    ax.plot(xs, ys)
+    ax.grid()
+    ax.set(label=f"Graph {no}")
 
-with open(target, "wb") as f:
-    fig.savefig(f)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    pyplot.close(fig)
+    return buffer.getvalue()
 
-pyplot.close(fig)
+def render_many(series: List[Tuple[List, List, int]], overlay: bool=False) -> List[bytes]:
+    """
+    Renders each (xs, ys, no) series as its own graph, or every series on one set of axes with ``overlay``.
+    """
+    if not overlay:
+        return [render(xs, ys, no) for xs, ys, no in series]
+
+    warm()
+    fig, ax = pyplot.subplots()
+    for xs, ys, no in series:
+        ax.plot(xs, ys, label=f"Graph {no}")
+
+    ax.grid()
+    ax.legend()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    pyplot.close(fig)
+    return [buffer.getvalue()]
+
+if __name__ == "__main__":
+    target = sys.argv[1]
+    data = json.loads(sys.argv[2])
+
+    # json turns the x values into strings
+    if "plots" in data:
+        png = render_many([([float(x) for x in p['keys'].keys()], list(p['keys'].values()), p['no']) for p in data['plots']], True)[0]
+    else:
+        kws = data['keys']
+        png = render([float(x) for x in kws.keys()], list(kws.values()), data['no'])
+    with open(target, "wb") as f:
+        f.write(png)
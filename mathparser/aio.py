@@ -0,0 +1,114 @@
+"""
+Parsing and evaluation off the event loop.
+"""
+import asyncio
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, List, Optional, Tuple, Union
+
+from .errors import *
+from .lex import MathLexer
+from .limits import Budget
+from .parse import Parser, Expression, PlottableFunction
+
+__all__ = "AsyncEvaluator",
+
+
+def _evaluate(user_input: str, budget: Optional[Budget], limits: dict, options: dict) -> List[Any]:
+    # runs in a worker. process workers can't share the caller's budget, so they start their own
+    lex = MathLexer()
+    parser = Parser(user_input, lex, budget=budget or Budget(**limits), **options)
+    exprs = parser.parse(list(lex.tokenize(user_input)))
+    return [expr.execute(None, parser) for expr in exprs]
+
+
+def _parse(user_input: str, budget: Budget, options: dict) -> Tuple[Parser, List[Union[Expression, PlottableFunction]]]:
+    lex = MathLexer()
+    parser = Parser(user_input, lex, budget=budget, **options)
+    exprs = parser.parse(list(lex.tokenize(user_input)))
+    parser.budget = None
+    return parser, exprs
+
+
+class AsyncEvaluator:
+    """
+    Parses and evaluates inputs in a pool of threads (``executor="thread"``) or processes (``executor="process"``),
+    so a slow input never blocks the event loop.
+
+    ``timeout`` is the wall clock limit for each request in seconds, and ``max_steps``, ``max_depth`` and
+    ``max_values`` limit the work evaluating an input may do (see :class:`~mathparser.limits.Budget`).
+    Requests that go over a limit raise :class:`LimitError`, and the work they started is abandoned at the next step.
+    Other errors are raised exactly as they are on the synchronous path. Extra keyword arguments are passed to each :class:`Parser`.
+    """
+    def __init__(
+            self,
+            executor: str="thread",
+            workers: Optional[int]=None,
+            timeout: Optional[float]=None,
+            max_steps: Optional[int]=None,
+            max_depth: Optional[int]=None,
+            max_values: Optional[int]=None,
+            mp_context=None,
+            **parser_options
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}'")
+
+        self.executor = executor
+        self.workers = workers
+        self.timeout = timeout
+        self.limits = dict(max_steps=max_steps, timeout=timeout, max_depth=max_depth, max_values=max_values)
+        self.mp_context = mp_context
+        self.parser_options = parser_options
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.executor == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="MathEvaluator")
+
+            return self._pool
+
+    async def _run(self, budget: Budget, pool: Optional[Executor], func, *args) -> Any:
+        future = asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            budget.cancel()
+            raise LimitError(f"Evaluation took longer than {self.timeout} seconds") from None
+        except asyncio.CancelledError:
+            budget.cancel()
+            raise
+
+    async def parse(self, user_input: str) -> Tuple[Parser, List[Union[Expression, PlottableFunction]]]:
+        """
+        Parses and validates ``user_input``, returning the parser and its expressions as :meth:`Parser.parse` would.
+        Parsing always happens in a thread, since parsers can't be sent between processes;
+        the returned parser has no budget, so its expressions can be executed as usual.
+        """
+        budget = Budget(**self.limits)
+        pool = self._get_pool() if self.executor == "thread" else None
+        return await self._run(budget, pool, _parse, user_input, budget, self.parser_options)
+
+    async def evaluate(self, user_input: str) -> List[Any]:
+        """
+        Parses ``user_input`` and executes every expression in it, returning their results in order.
+        """
+        budget = Budget(**self.limits)
+        if self.executor == "process":
+            args = (user_input, None, self.limits, self.parser_options)
+        else:
+            args = (user_input, budget, None, self.parser_options)
+
+        return await self._run(budget, self._get_pool(), _evaluate, *args)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        if pool is not None:
+            pool.shutdown(wait=False)
@@ -0,0 +1,133 @@
+"""
+Evaluation of large batches of independent inputs across every core.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional
+
+from .errors import *
+from .lex import MathLexer
+from .limits import Budget
+from .parse import Parser
+
+__all__ = "BulkResult", "BulkEvaluator"
+
+_lexer: Optional[MathLexer] = None
+_limits: dict = {}
+_options: dict = {}
+
+
+class BulkResult:
+    """
+    The outcome of one input. ``values`` holds a result per expression, unless the input raised,
+    in which case ``error_type`` is the name of the exception and ``error`` its formatted message.
+    """
+    __slots__ = "values", "error_type", "error"
+
+    def __init__(self, values: Optional[List[Any]], error_type: Optional[str]=None, error: Optional[str]=None):
+        self.values = values
+        self.error_type = error_type
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error_type is None
+
+    def __repr__(self):
+        if self.error_type is not None:
+            return f"<BulkResult error_type={self.error_type} error={self.error!r}>"
+
+        return f"<BulkResult values={self.values!r}>"
+
+
+def _warm(limits: dict, options: dict):
+    # builds everything an input needs once per worker, rather than once per input
+    global _lexer, _limits, _options
+    _lexer = MathLexer()
+    _limits = limits
+    _options = options
+
+
+def _evaluate(user_input: str) -> BulkResult:
+    budget = Budget(**_limits) if any(x is not None for x in _limits.values()) else None
+    parser = Parser(user_input, _lexer, budget=budget, **_options)
+
+    try:
+        exprs = parser.parse(list(_lexer.tokenize(user_input)))
+        return BulkResult([expr.execute(None, parser) for expr in exprs])
+    except INPUT_ERRORS as e:
+        return BulkResult(None, type(e).__name__, _describe(e))
+
+
+def _describe(error: Exception) -> str:
+    # formatting a traceback reads the input back, and a bug there mustn't fail the rest of the batch
+    try:
+        return str(error)
+    except Exception:
+        return getattr(error, "message", None) or repr(error)
+
+
+class BulkEvaluator:
+    """
+    Evaluates batches of independent inputs in a pool of worker processes, returning a :class:`BulkResult`
+    per input, in the order they were given.
+
+    Inputs are sent to the workers ``chunksize`` at a time; larger chunks mean less inter-process overhead,
+    smaller ones balance uneven inputs better. ``max_steps``, ``timeout``, ``max_depth`` and ``max_values``
+    limit each input (see :class:`~mathparser.limits.Budget`). Extra keyword arguments are passed to each :class:`Parser`.
+    """
+    def __init__(
+            self,
+            workers: Optional[int]=None,
+            chunksize: int=64,
+            max_steps: Optional[int]=None,
+            timeout: Optional[float]=None,
+            max_depth: Optional[int]=None,
+            max_values: Optional[int]=None,
+            mp_context=None,
+            **parser_options
+    ):
+        if chunksize < 1:
+            raise ValueError("chunksize must be at least 1")
+
+        self.workers = workers
+        self.chunksize = chunksize
+        self.mp_context = mp_context
+        self.limits = dict(max_steps=max_steps, timeout=timeout, max_depth=max_depth, max_values=max_values)
+        self.options = parser_options
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self.mp_context,
+                    initializer=_warm,
+                    initargs=(self.limits, self.options)
+                )
+
+            return self._executor
+
+    def iter_evaluate(self, inputs: Iterable[str]) -> Iterator[BulkResult]:
+        """
+        Yields a result per input, in order, as soon as the chunk it belongs to is done.
+        """
+        return self._get_executor().map(_evaluate, inputs, chunksize=self.chunksize)
+
+    def evaluate(self, inputs: Iterable[str]) -> List[BulkResult]:
+        return list(self.iter_evaluate(inputs))
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
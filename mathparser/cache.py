@@ -0,0 +1,196 @@
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+from .lex import MathLexer
+from .parse import Parser, Expression, BUILTINS
+
+__all__ = "LRUCache", "ParseCache", "normalize_input"
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread safe, least-recently-used mapping bounded by number of entries and/or total size.
+    ``sizeof`` measures each value, and is required when ``max_bytes`` is given.
+    """
+    def __init__(self, max_entries: Optional[int]=None, max_bytes: Optional[int]=None, sizeof: Callable[[Any], int]=None):
+        if max_bytes is not None and sizeof is None:
+            raise ValueError("sizeof is required to limit the cache by size")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return # would evict everything, and still not fit
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+
+            self._data[key] = (value, size)
+            self.nbytes += size
+
+            while (self.max_entries is not None and len(self._data) > self.max_entries) or \
+                    (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._data),
+            "bytes": self.nbytes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_SPACED_SYMBOL_RE = re.compile(r" ?([+\-*/^,=]) ?")
+
+
+def normalize_input(user_input: str) -> str:
+    """
+    Collapses runs of whitespace, drops blank lines and removes spaces around operators, commas,
+    and the insides of brackets, none of which change how an input parses.
+    """
+    lines = []
+    for line in user_input.splitlines():
+        line = " ".join(line.split())
+        if line:
+            line = _SPACED_SYMBOL_RE.sub(r"\1", line).replace("( ", "(").replace(" )", ")")
+            lines.append(line)
+
+    return "\n".join(lines)
+
+
+def _sizeof(obj: Any, seen: set) -> int:
+    # a rough, deep sys.getsizeof. shared objects (builtins, interned values) are only counted once.
+    # it walks an explicit stack, since the trees of deeply nested inputs are deeper than the recursion limit
+    size = 0
+    todo = [obj]
+    while todo:
+        obj = todo.pop()
+        if obj is None or id(obj) in seen:
+            continue
+
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            todo.extend(obj.keys())
+            todo.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            todo.extend(obj)
+        elif not isinstance(obj, (str, bytes, int, float)) and not callable(obj):
+            todo.extend(getattr(obj, s, None) for cls in type(obj).__mro__ for s in getattr(cls, "__slots__", ()))
+            todo.append(getattr(obj, "__dict__", None))
+
+    return size
+
+
+class _ParsedProgram:
+    __slots__ = "input", "tokens", "exprs", "definitions", "sequence", "state_version"
+
+    def __init__(self, parser: Parser, exprs: List[Expression]):
+        self.input = parser.input
+        self.tokens = parser.tokens
+        self.exprs = exprs
+        self.definitions = dict(parser.state) # only the input's own definitions, never the builtins
+        self.sequence = parser.sequence
+        self.state_version = parser.state_version
+
+    def make_parser(self, lex: MathLexer, **kwargs) -> Parser:
+        parser = Parser(self.input, lex, **kwargs)
+        parser.tokens = self.tokens
+        parser.state.update(self.definitions)
+        parser.sequence = self.sequence
+        parser.state_version = self.state_version
+        return parser
+
+
+class ParseCache:
+    """
+    A bounded cache of parsed and validated inputs, keyed by the input with its whitespace normalized
+    and whether it was optimized.
+    Parsed expressions and definitions are shared between every hit, but each call gets its own :class:`Parser`
+    (and so its own state). Inputs that fail to parse are not cached.
+
+    Note that on both hits and misses, the input is parsed (and errors are reported) in its normalized form.
+    """
+    def __init__(self, max_entries: int=1024, max_bytes: Optional[int]=None):
+        self._lru = LRUCache(max_entries, max_bytes, sizeof=lambda entry: entry[1])
+
+    def parse(self, user_input: str, lex: MathLexer=None, **kwargs) -> Tuple[Parser, List[Expression]]:
+        """
+        Returns a fresh parser and the parsed expressions for ``user_input``.
+        Extra keyword arguments are passed to the :class:`Parser`.
+        """
+        lex = lex or MathLexer()
+        normalized = normalize_input(user_input)
+        # optimized and unoptimized programs differ, so one is never handed out in place of the other
+        key = normalized, kwargs.get("optimize", True)
+        collector = kwargs.get("collector")
+        entry = self._lru.get(key)
+        if entry is not None:
+            program = entry[0]
+            if collector is not None:
+                collector.cache("parse", self.stats())
+
+            return program.make_parser(lex, **kwargs), list(program.exprs)
+
+        parser = Parser(normalized, lex, **kwargs)
+        exprs = parser.parse(lex.tokenize(normalized))
+        program = _ParsedProgram(parser, exprs)
+        self._lru.put(key, (program, _sizeof(program, {id(x) for x in BUILTINS.builtins.values()})))
+        if collector is not None:
+            collector.cache("parse", self.stats())
+
+        return parser, list(exprs)
+
+    def clear(self):
+        self._lru.clear()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Hit/miss/eviction counters, the number of cached inputs, and their estimated size in bytes.
+        """
+        return self._lru.stats()
@@ -0,0 +1,166 @@
+from typing import List, Union, Sequence, Tuple, Any
+
+from .nodes import *
+from .parse import Parser
+
+__all__ = "Program", "compile_node"
+
+# opcodes
+LOAD_CONST = 0
+LOAD_SLOT = 1
+LOAD_NAME = 2
+BINARY = 3
+NEGATE = 4
+CALL = 5
+STORE_TEMP = 6
+LOAD_TEMP = 7
+
+_MISSING = object()
+
+
+class Program:
+    """
+    The postfix form of an expression's syntax tree.
+    Variables named in ``slots`` are read from a frame (a list, indexed by slot) instead of a namespace dict.
+    Hoisted sub-expressions are kept in ``temps`` registers for the length of a run.
+    Its calls are checked against the parser state before running, whenever the state changed since the last check.
+    """
+    __slots__ = "code", "slots", "depth", "temps", "checked"
+
+    def __init__(self, code: List[Tuple[int, Any]], slots: Tuple[str, ...], depth: int, temps: int=0):
+        self.code = code
+        self.slots = slots
+        self.depth = depth
+        self.temps = temps
+        self.checked = None # the state version the calls were last checked against
+
+    def __repr__(self):
+        return f"<Program slots={self.slots} depth={self.depth} temps={self.temps} code={self.code}>"
+
+    def make_frame(self, parser: Parser, namespace: dict=None) -> list:
+        frame = []
+        for name in self.slots:
+            value = namespace.get(name, _MISSING) if namespace else _MISSING
+            if value is _MISSING:
+                value = parser.get_var(name)
+
+            frame.append(value)
+
+        return frame
+
+    def execute(self, parser: Parser, namespace: dict=None) -> Union[int, float]:
+        return self.run(parser, self.make_frame(parser, namespace) if self.slots else ())
+
+    def check(self, parser: Parser):
+        # a function may have been redefined (or removed) since the program was validated
+        for code, arg in self.code:
+            if code == CALL:
+                parser.resolve_call(*arg)
+
+        self.checked = parser.state_version
+
+    def run(self, parser: Parser, frame: Sequence[Union[int, float]]) -> Union[int, float]:
+        if self.checked != parser.state_version:
+            self.check(parser)
+
+        if parser.budget is not None:
+            parser.budget.charge(len(self.code), self.depth + self.temps)
+
+        stack = [None] * self.depth
+        temps = [None] * self.temps
+        sp = 0
+
+        for code, arg in self.code:
+            if code == LOAD_CONST:
+                stack[sp] = arg
+                sp += 1
+            elif code == LOAD_SLOT:
+                stack[sp] = frame[arg]
+                sp += 1
+            elif code == BINARY:
+                sp -= 1
+                stack[sp-1] = arg.execute(parser, stack[sp-1], stack[sp])
+            elif code == LOAD_NAME:
+                stack[sp] = parser.get_var_with_state(arg)
+                sp += 1
+            elif code == NEGATE:
+                stack[sp-1] = -stack[sp-1]
+            elif code == STORE_TEMP:
+                temps[arg] = stack[sp-1]
+            elif code == LOAD_TEMP:
+                stack[sp] = temps[arg]
+                sp += 1
+            else: # CALL
+                node, argc = arg
+                sp -= argc
+                stack[sp] = parser.call(node, stack[sp:sp+argc])
+                sp += 1
+
+        return stack[0]
+
+
+class _Compiler:
+    __slots__ = "slots", "code", "sp", "depth", "temps"
+
+    def __init__(self, slots: Tuple[str, ...]):
+        self.slots = slots
+        self.code = []
+        self.sp = 0
+        self.depth = 0
+        self.temps = 0
+
+    def emit(self, code: int, arg: Any=None, stack_effect: int=0):
+        self.code.append((code, arg))
+        self.sp += stack_effect
+        if self.sp > self.depth:
+            self.depth = self.sp
+
+    def node(self, root: Node):
+        # an explicit post-order walk, so deeply nested input can't hit the recursion limit
+        todo: List[Tuple[Node, bool]] = [(root, False)]
+        while todo:
+            node, visited = todo.pop()
+
+            if isinstance(node, Num):
+                self.emit(LOAD_CONST, node.value, 1)
+
+            elif isinstance(node, Var):
+                if node.name in self.slots:
+                    self.emit(LOAD_SLOT, self.slots.index(node.name), 1)
+                else:
+                    self.emit(LOAD_NAME, node.token, 1)
+
+            elif isinstance(node, Neg) and isinstance(node.operand, Num):
+                self.emit(LOAD_CONST, -node.operand.value, 1)
+
+            elif isinstance(node, Hoisted) and not node.first:
+                self.emit(LOAD_TEMP, node.index, 1)
+
+            elif visited:
+                if isinstance(node, BinOp):
+                    self.emit(BINARY, node.op, -1)
+                elif isinstance(node, Neg):
+                    self.emit(NEGATE)
+                elif isinstance(node, Hoisted):
+                    self.emit(STORE_TEMP, node.index)
+                    self.temps = max(self.temps, node.index + 1)
+                else:
+                    argc = len(node.args)
+                    self.emit(CALL, (node, argc), 1 - argc)
+
+            elif isinstance(node, (BinOp, Neg, Call, Hoisted)):
+                todo.append((node, True))
+                todo.extend((child, False) for child in reversed(node.children()))
+
+            else:
+                raise RuntimeError(f"unable to compile {node!r}")
+
+
+def compile_node(parser: Parser, node: Node, slots: Sequence[str]=()) -> Program:
+    """
+    Compiles an expression node into a :class:`Program`. Names found in ``slots`` are resolved to frame indexes,
+    everything else is looked up in the parser state when the program runs.
+    """
+    compiler = _Compiler(tuple(slots))
+    compiler.node(node)
+    return Program(compiler.code, compiler.slots, compiler.depth, compiler.temps)
@@ -0,0 +1,89 @@
+"""
+A long-lived front end that many requests can share.
+"""
+import threading
+from typing import Any, List, Optional, Tuple, Union
+
+from .lex import MathLexer
+from .limits import Budget
+from .parse import Parser, Expression, PlottableFunction
+
+__all__ = "Engine",
+
+
+class Engine:
+    """
+    Holds everything that can be shared between requests (options, limits, the memo and an optional
+    :class:`~mathparser.ParseCache`), and hands out a cheap :class:`Parser` per request with :meth:`context`.
+    An engine can be used from any number of threads at once; each thread gets its own lexer, and each context
+    its own definitions and budget, layered over the shared builtins.
+
+    ``max_steps``, ``timeout``, ``max_depth`` and ``max_values`` limit each request (see :class:`~mathparser.limits.Budget`).
+    ``memo`` may be a number of results to keep, and is shared by every context. Extra keyword arguments are passed to
+    each :class:`Parser`.
+    """
+    def __init__(
+            self,
+            max_steps: Optional[int]=None,
+            timeout: Optional[float]=None,
+            max_depth: Optional[int]=None,
+            max_values: Optional[int]=None,
+            memo: Union[int, "LRUCache", None]=None,
+            cache: Optional["ParseCache"]=None,
+            **parser_options
+    ):
+        if isinstance(memo, int):
+            from .cache import LRUCache
+            memo = LRUCache(max_entries=memo)
+
+        self.limits = dict(max_steps=max_steps, timeout=timeout, max_depth=max_depth, max_values=max_values)
+        self.memo: Optional["LRUCache"] = memo
+        self.cache = cache
+        self.options = dict(parser_options, memo=memo)
+        self._limited = any(x is not None for x in self.limits.values())
+        self._local = threading.local()
+
+    @property
+    def lexer(self) -> MathLexer:
+        """
+        This thread's lexer. Lexers keep state while tokenizing, so they are never shared between threads.
+        """
+        lex = getattr(self._local, "lexer", None)
+        if lex is None:
+            lex = self._local.lexer = MathLexer()
+
+        return lex
+
+    def _budget(self) -> Optional[Budget]:
+        return Budget(**self.limits) if self._limited else None
+
+    def context(self, user_input: str="", collector: Optional["Collector"]=None) -> Parser:
+        """
+        Returns a fresh parser for one request. Creating one copies nothing, so it's fine to make one per input.
+        """
+        return Parser(user_input, self.lexer, budget=self._budget(), collector=collector, **self.options)
+
+    def parse(
+            self,
+            user_input: str,
+            collector: Optional["Collector"]=None
+    ) -> Tuple[Parser, List[Union[Expression, PlottableFunction]]]:
+        """
+        Parses and validates ``user_input`` in a new context, returning the parser and its expressions as
+        :meth:`Parser.parse` would. With a ``cache``, inputs that have been seen before aren't parsed again.
+        """
+        if self.cache is not None:
+            return self.cache.parse(user_input, self.lexer, budget=self._budget(), collector=collector, **self.options)
+
+        parser = self.context(user_input, collector)
+        return parser, parser.parse(self.lexer.tokenize(user_input))
+
+    def evaluate(self, user_input: str, collector: Optional["Collector"]=None) -> List[Any]:
+        """
+        Parses ``user_input`` and executes every expression in it, returning their results in order.
+        """
+        parser, exprs = self.parse(user_input, collector)
+        return [expr.execute(None, parser) for expr in exprs]
+
+    def __repr__(self):
+        return f"<Engine limits={self.limits} cache={self.cache!r}>"
@@ -1,10 +1,12 @@
 from typing import List
-from sly.lex import Token
+from .tokens import Token, find_token
 
 __all__ = (
     "UserInputError",
     "TokenizedUserInputError",
-    "EvaluationError"
+    "EvaluationError",
+    "LimitError",
+    "INPUT_ERRORS",
 )
 
 class UserInputError(Exception):
@@ -49,6 +51,9 @@ class TokenizedUserInputError(UserInputError):
     def __str__(self):
         return self.make_traceback()
 
+    def __reduce__(self):
+        return type(self), (self.input, self.token, self.message)
+
 
 class EvaluationError(UserInputError):
     def __init__(self, nearby: List[Token], token: Token, left: int, right: int, message: str):
@@ -60,27 +65,42 @@ class EvaluationError(UserInputError):
 
     def make_traceback(self):
         inp = self.input
-        try:
-            index = self.input.index(self.token)
-            close_tokens = [str(x.value) for x in inp[index-1:index+2]]
-
-            a = ""
-            if index - 2 < 0:
-                top = ""
-            else:
-                top = a = str(inp[index-2].value)
-
-            top += " >>" + " ".join(close_tokens) + "<< "
-            if index + 2 < len(inp):
-                b = str(inp[index+3].value)
-                top += b
-
-            lowtok_under = str(self.left) + (" "*(len(str(inp[index-1].value))-len(str(self.left))))
-            mid = f"{' '*len(a)}   {lowtok_under}   {self.right}"
-            formatted = f">{top}\n>{mid}\n{'~'*len(mid)}\n{self.message}"
-            return formatted
-        except ValueError:
+        index = find_token(inp, self.token)
+        if index is None:
             return f">[unable to locate traceback]\n>{self.left}\t\t{self.right}\n>~~~~~~~~~~~~~~~~~\n>{self.message}"
 
+        close_tokens = [str(x.value) for x in inp[index-1:index+2]]
+
+        a = ""
+        if index - 2 < 0:
+            top = ""
+        else:
+            top = a = str(inp[index-2].value)
+
+        top += " >>" + " ".join(close_tokens) + "<< "
+        if index + 3 < len(inp):
+            b = str(inp[index+3].value)
+            top += b
+
+        lowtok_under = str(self.left) + (" "*(len(str(inp[index-1].value))-len(str(self.left))))
+        mid = f"{' '*len(a)}   {lowtok_under}   {self.right}"
+        formatted = f">{top}\n>{mid}\n{'~'*len(mid)}\n{self.message}"
+        return formatted
+
     def __str__(self):
         return self.make_traceback()
+
+    def __reduce__(self):
+        return type(self), (self.input, self.token, self.left, self.right, self.message)
+
+
+class LimitError(UserInputError):
+    """
+    Evaluation went over one of its budget's limits, was cancelled, or took too long.
+    Unlike other errors, this stops the whole evaluation rather than a single row, line or point.
+    """
+
+
+# everything that evaluating a bad input can raise. these only fail that input (or row, or line),
+# where several are evaluated together. recursion and memory errors come from definitions such as p(x)=p(x)+1
+INPUT_ERRORS = (UserInputError, ArithmeticError, ValueError, RecursionError, MemoryError)
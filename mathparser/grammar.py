@@ -0,0 +1,218 @@
+"""
+An operator precedence parser, turning the tokens from :class:`~mathparser.lex.MathLexer`
+into the syntax tree in :mod:`mathparser.nodes`.
+"""
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .tokens import Token
+
+from .errors import *
+from .nodes import *
+from .parse import Operator
+
+__all__ = "BINDING_POWER", "parse_expression", "iter_statements"
+
+# the order operators have always been applied in. every level is left associative
+BINDING_POWER = {
+    "-": 10,
+    "+": 20,
+    "*": 30,
+    "/": 40,
+    "^": 50,
+}
+
+_CALLS = {"FUNCTION_CALL", "SEQUENCE_N_CALL", "SEQUENCE_S_CALL", "SEQUENCE_SN_CALL"}
+_OPERANDS = {"NUMBER", "NAME", "("} | _CALLS
+
+
+def _implicit_multiply(before: Token) -> Token:
+    return Token("OPERATOR", "*", before.lineno, before.index, before.index)
+
+
+class _Source:
+    # a list of tokens being read. brackets share their enclosing expression's source, call arguments get their own
+    __slots__ = "tokens", "pos", "owner"
+
+    def __init__(self, tokens: List[Token], owner: Token):
+        self.tokens = tokens
+        self.pos = 0
+        self.owner = owner # blamed when there's no expression at all
+
+
+class _Frame:
+    # an expression being parsed: the whole input, a bracket (``opener``), or one argument of ``call``
+    __slots__ = "source", "opener", "call", "operands", "operators", "negations"
+
+    def __init__(self, source: _Source, opener: Optional[Token]=None, call: Optional[Tuple[Token, List[Node]]]=None):
+        self.source = source
+        self.opener = opener
+        self.call = call
+        self.operands: List[Node] = []
+        self.operators: List[Operator] = []
+        self.negations: List[Token] = [] # unary minuses waiting for their operand
+
+    def operand(self, node: Node):
+        for tok in reversed(self.negations):
+            node = Neg(tok, node)
+
+        self.negations.clear()
+        self.operands.append(node)
+
+    def operator(self, op: Operator):
+        # every level is left associative, so anything already waiting at the same level or above goes first
+        bp = BINDING_POWER[op.op]
+        while self.operators and BINDING_POWER[self.operators[-1].op] >= bp:
+            self.reduce()
+
+        self.operators.append(op)
+
+    def reduce(self):
+        right = self.operands.pop()
+        left = self.operands.pop()
+        self.operands.append(BinOp(self.operators.pop(), left, right))
+
+    def finish(self) -> Node:
+        while self.operators:
+            self.reduce()
+
+        return self.operands[0]
+
+
+def _error(user_input: str, token: Token, message: str):
+    raise TokenizedUserInputError(user_input, token, message)
+
+
+def parse_expression(user_input: str, tokens: List[Token], owner: Token=None) -> Node:
+    """
+    Parses a single expression. ``owner`` is the token to report if ``tokens`` is empty.
+
+    Brackets, unary minuses and call arguments are kept on an explicit stack rather than parsed recursively,
+    so no amount of nesting can hit the recursion limit.
+    """
+    stack = [_Frame(_Source(tokens, owner))]
+
+    while True:
+        frame = stack[-1]
+        source = frame.source
+        tok = source.tokens[source.pos] if source.pos < len(source.tokens) else None
+
+        if len(frame.operands) == len(frame.operators):
+            # expecting an operand
+            if tok is None:
+                previous = source.tokens[source.pos-1] if source.pos else source.owner
+                if previous.type == "OPERATOR":
+                    _error(user_input, previous, "Unexpected operator")
+
+                _error(user_input, previous, "Expected an expression")
+
+            source.pos += 1
+            type_ = tok.type
+
+            if type_ == "NUMBER":
+                frame.operand(Num(tok, tok.value))
+
+            elif type_ == "NAME":
+                frame.operand(Var(tok))
+
+            elif type_ == "(":
+                stack.append(_Frame(source, opener=tok))
+
+            elif type_ == "OPERATOR":
+                if tok.value != "-":
+                    _error(user_input, tok, "Unexpected operator")
+
+                frame.negations.append(tok)
+
+            elif type_ in _CALLS:
+                group = tok.value
+                if group.args:
+                    stack.append(_Frame(_Source(group.args[0], tok), call=(tok, [])))
+                else:
+                    frame.operand((Call if type_ == "FUNCTION_CALL" else SeqCall)(tok, group.name, []))
+
+            elif type_ in ("FUNCTION", "PLOT_FUNCTION"):
+                _error(user_input, tok, "Functions are not allowed here")
+
+            elif type_ == "SEQUENCE":
+                _error(user_input, tok, "Sequences are not allowed here")
+
+            elif type_ == ")":
+                _error(user_input, tok, "Expected an expression")
+
+            else:
+                _error(user_input, tok, f"Unexpected '{tok.value}'")
+
+            continue
+
+        # expecting an operator, or the end of the expression
+        if tok is not None and tok.type == "OPERATOR":
+            source.pos += 1
+            frame.operator(Operator(tok))
+            continue
+
+        if tok is not None and tok.type in _OPERANDS:
+            frame.operator(Operator(_implicit_multiply(tok)))
+            continue
+
+        if tok is not None and tok.type != ")":
+            _error(user_input, tok, f"Unexpected '{tok.value}'")
+
+        if frame.opener is not None:
+            if tok is None:
+                _error(user_input, frame.opener, "Unclosed bracket")
+
+            source.pos += 1
+            stack.pop()
+            stack[-1].operand(frame.finish())
+            continue
+
+        if tok is not None:
+            _error(user_input, tok, "Unexpected closing bracket")
+
+        node = frame.finish()
+        stack.pop()
+        if frame.call is None:
+            return node
+
+        call, args = frame.call
+        args.append(node)
+        group = call.value
+        if len(args) < len(group.args):
+            stack.append(_Frame(_Source(group.args[len(args)], call), call=frame.call))
+        else:
+            stack[-1].operand((Call if call.type == "FUNCTION_CALL" else SeqCall)(call, group.name, args))
+
+
+def _statement(user_input: str, line: List[Token]) -> Node:
+    first = line[0]
+    if first.type == "FUNCTION":
+        group = first.value
+        for i, param in enumerate(group.params):
+            if param in group.params[:i]:
+                _error(user_input, first, f"Parameter '{param}' is given more than once")
+
+        return FuncDef(first, group.name, list(group.params), parse_expression(user_input, group.body, first))
+
+    elif first.type == "PLOT_FUNCTION":
+        return Plot(first, parse_expression(user_input, first.value.body, first))
+
+    elif first.type == "SEQUENCE":
+        return SeqDef(first, [parse_expression(user_input, value, first) for value in first.value.values])
+
+    return parse_expression(user_input, line, first)
+
+
+def iter_statements(user_input: str, tokens: Iterable[Token]) -> Iterator[Node]:
+    """
+    Yields a node for each line of input as soon as its tokens have been read.
+    Definitions are yielded as :class:`FuncDef`, :class:`Plot` and :class:`SeqDef`, everything else as an expression.
+    """
+    line = []
+    for tok in tokens:
+        if tok.type != "NEWLINE":
+            line.append(tok)
+        elif line:
+            yield _statement(user_input, line)
+            line = []
+
+    if line:
+        yield _statement(user_input, line)
@@ -1,28 +1,385 @@
 import subprocess
 import sys
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import asyncio
 import secrets
 import os
 import io
 import json
 import pathlib
+import threading
+import hashlib
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Union
+
+from . import _graph
+from .cache import LRUCache
+
+__all__ = "RenderCache", "Renderer", "configure", "cache_stats", "plot", "plot_many"
 
-pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix="MathGraphWaiter")
 TMP_DIR = pathlib.Path(os.path.dirname(__file__), "tmp")
 GRAPH_FILE = str(pathlib.Path(os.path.dirname(__file__), "_graph.py"))
 
-if not TMP_DIR.exists():
-    TMP_DIR.mkdir()
+# created on first use, since most processes never render with the subprocess backend
+_pool: Optional[ThreadPoolExecutor] = None
+_tmp_dir: Optional[str] = None
+_setup_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _setup_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix="MathGraphWaiter")
+
+        return _pool
+
+
+def _get_tmp_dir() -> str:
+    # the package's tmp directory, or the system's if the package is installed somewhere read only
+    global _tmp_dir
+    with _setup_lock:
+        if _tmp_dir is None:
+            try:
+                TMP_DIR.mkdir(exist_ok=True)
+                _tmp_dir = str(TMP_DIR)
+            except OSError:
+                _tmp_dir = tempfile.gettempdir()
+
+        return _tmp_dir
+
+
+def __getattr__(name: str):
+    if name == "pool": # kept for anything that used the module level pool directly
+        return _get_pool()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class RenderCache:
+    """
+    Caches rendered PNGs by a hash of the points and plot options.
+    Images are kept in memory up to ``max_bytes``, and optionally written to ``directory``,
+    which is trimmed (least recently used first) to ``max_disk_bytes``.
+    """
+    def __init__(self, max_bytes: int=32 * 1024 * 1024, directory: Optional[Union[str, os.PathLike]]=None, max_disk_bytes: int=256 * 1024 * 1024):
+        self.memory = LRUCache(max_bytes=max_bytes, sizeof=len)
+        self.directory = pathlib.Path(directory) if directory is not None else None
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self.disk_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.png"), key=lambda f: f.stat().st_mtime)
+            for file in files:
+                size = file.stat().st_size
+                self._disk[file.stem] = size
+                self.disk_bytes += size
+
+            self._trim_disk()
+
+    @staticmethod
+    def key(points: Sequence[dict], numbers: Sequence[int], overlay: bool=False) -> str:
+        data = repr(([tuple(p.items()) for p in points], tuple(numbers), overlay)).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        png = self.memory.get(key)
+        if png is not None or self.directory is None:
+            return png
+
+        with self._lock:
+            if key not in self._disk:
+                return None
+
+            self._disk.move_to_end(key)
+
+        file = self.directory / f"{key}.png"
+        try:
+            png = file.read_bytes()
+            os.utime(file)
+        except OSError:
+            with self._lock:
+                self.disk_bytes -= self._disk.pop(key, 0)
+            return None
+
+        self.disk_hits += 1
+        self.memory.put(key, png)
+        return png
+
+    def put(self, key: str, png: bytes):
+        self.memory.put(key, png)
+        if self.directory is None:
+            return
+
+        file = self.directory / f"{key}.png"
+        tmp = self.directory / f"{key}.{secrets.token_hex(4)}.tmp"
+        try:
+            tmp.write_bytes(png)
+            os.replace(tmp, file)
+        except OSError:
+            return
+
+        with self._lock:
+            self.disk_bytes += len(png) - self._disk.pop(key, 0)
+            self._disk[key] = len(png)
+            self._trim_disk()
+
+    def _trim_disk(self):
+        while self._disk and self.disk_bytes > self.max_disk_bytes:
+            key, size = self._disk.popitem(last=False)
+            self.disk_bytes -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self.directory / f"{key}.png")
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        stats = self.memory.stats()
+        stats.update(
+            disk_hits=self.disk_hits,
+            disk_evictions=self.disk_evictions,
+            disk_entries=len(self._disk),
+            disk_bytes=self.disk_bytes,
+        )
+        return stats
+
+
+class Renderer:
+    """
+    Renders graphs in a pool of long-lived worker processes that keep matplotlib imported.
+    Points are sent to the workers over the pool's pipes, and the PNG comes back as bytes.
+
+    ``workers`` is the number of worker processes, ``max_concurrency`` caps how many renders may be in flight
+    (queued or running) at once per event loop. With ``backend="subprocess"``, every graph is rendered
+    by a fresh interpreter through a temporary file instead, which is also used as a fallback if the pool breaks.
+    Rendered images are looked up in, and added to, ``cache`` when one is given.
+    """
+    def __init__(
+            self,
+            workers: int=2,
+            max_concurrency: Optional[int]=None,
+            backend: str="pool",
+            mp_context=None,
+            cache: Optional[RenderCache]=None
+    ):
+        if backend not in ("pool", "subprocess"):
+            raise ValueError(f"Unknown graph backend '{backend}'")
+
+        self.workers = workers
+        self.max_concurrency = max_concurrency or workers * 4
+        self.backend = backend
+        self.mp_context = mp_context
+        self.cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self.mp_context,
+                    initializer=_graph.warm
+                )
+
+            return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        return self._semaphore
+
+    async def render(self, points: dict, no: int) -> io.BytesIO:
+        key = None
+        if self.cache is not None:
+            key = self.cache.key([points], [no])
+            png = self.cache.get(key)
+            if png is not None:
+                return io.BytesIO(png)
+
+        resp = await self._render(points, no)
+        if key is not None:
+            self.cache.put(key, resp.getvalue())
+
+        return resp
+
+    async def _render(self, points: dict, no: int) -> io.BytesIO:
+        if self.backend == "subprocess":
+            return await _plot_subprocess(points, no)
 
-async def plot(points: dict, no: int):
-    filename = os.path.join(TMP_DIR, secrets.token_urlsafe(5) + ".png")
-    data = json.dumps({"keys": points, "no": no})
+        async with self._get_semaphore():
+            executor = self._get_executor()
+            try:
+                png = await asyncio.get_running_loop().run_in_executor(
+                    executor, _graph.render, list(points.keys()), list(points.values()), no
+                )
+            except BrokenProcessPool:
+                self._discard(executor)
+                return await _plot_subprocess(points, no)
+
+        return io.BytesIO(png)
+
+    async def render_many(self, points: Sequence[dict], numbers: Sequence[int]=None, overlay: bool=False) -> List[io.BytesIO]:
+        numbers = numbers or range(1, len(points) + 1)
+        if len(numbers) != len(points):
+            raise ValueError("Expected one graph number per set of points")
+
+        if not points:
+            return []
+
+        if self.cache is None:
+            return await self._render_many(points, numbers, overlay)
+
+        if overlay:
+            keys = [self.cache.key(points, numbers, True)]
+            images: List[Optional[bytes]] = [self.cache.get(keys[0])]
+        else:
+            keys = [self.cache.key([p], [no]) for p, no in zip(points, numbers)]
+            images = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, png in enumerate(images) if png is None]
+        if missing:
+            if overlay:
+                rendered = await self._render_many(points, numbers, True)
+            else:
+                rendered = await self._render_many([points[i] for i in missing], [numbers[i] for i in missing], False)
+
+            for i, resp in zip(missing, rendered):
+                images[i] = resp.getvalue()
+                self.cache.put(keys[i], images[i])
+
+        return [io.BytesIO(png) for png in images]
+
+    async def _render_many(self, points: Sequence[dict], numbers: Sequence[int], overlay: bool) -> List[io.BytesIO]:
+        if self.backend == "subprocess":
+            return await _plot_many_subprocess(points, numbers, overlay)
+
+        series = [(list(p.keys()), list(p.values()), no) for p, no in zip(points, numbers)]
+        async with self._get_semaphore():
+            executor = self._get_executor()
+            try:
+                pngs = await asyncio.get_running_loop().run_in_executor(executor, _graph.render_many, series, overlay)
+            except BrokenProcessPool:
+                self._discard(executor)
+                return await _plot_many_subprocess(points, numbers, overlay)
+
+        return [io.BytesIO(png) for png in pngs]
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+        executor.shutdown(wait=False)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown()
+
+
+_renderer = Renderer(cache=RenderCache())
+
+
+def configure(
+        workers: int=2,
+        max_concurrency: Optional[int]=None,
+        backend: str="pool",
+        mp_context=None,
+        cache: Union[RenderCache, bool]=True
+) -> Renderer:
+    """
+    Replaces the renderer used by :func:`plot`. See :class:`Renderer` for the arguments.
+    ``cache`` may be a :class:`RenderCache`, True for a new in-memory cache, or False to disable caching.
+    """
+    global _renderer
+    if cache is True:
+        cache = RenderCache()
+
+    old, _renderer = _renderer, Renderer(workers, max_concurrency, backend, mp_context, cache or None)
+    old.close()
+    return _renderer
+
+
+def cache_stats() -> Optional[Dict[str, Union[int, float]]]:
+    """
+    Hit/miss/eviction counters for the default renderer's cache, or None if caching is disabled.
+    """
+    cache = _renderer.cache
+    return cache.stats() if cache is not None else None
+
+
+async def _plot_subprocess(points: dict, no: int) -> io.BytesIO:
+    return await _run_graph_script({"keys": points, "no": no})
+
+
+async def _plot_many_subprocess(points: Sequence[dict], numbers: Sequence[int], overlay: bool) -> List[io.BytesIO]:
+    if overlay:
+        return [await _run_graph_script({"plots": [{"keys": p, "no": no} for p, no in zip(points, numbers)]})]
+
+    return list(await asyncio.gather(*[_plot_subprocess(p, no) for p, no in zip(points, numbers)]))
+
+
+async def _run_graph_script(payload: dict) -> io.BytesIO:
+    filename = os.path.join(_get_tmp_dir(), secrets.token_urlsafe(5) + ".png")
+    data = json.dumps(payload)
     sub = subprocess.Popen(args=(sys.executable, GRAPH_FILE, filename, data), executable=sys.executable)
-    await asyncio.get_running_loop().run_in_executor(pool, sub.wait)
+    await asyncio.get_running_loop().run_in_executor(_get_pool(), sub.wait)
 
     with open(filename, "rb") as f:
         resp = io.BytesIO(f.read())
 
     os.remove(filename)
     return resp
+
+
+async def _measured(collector: "Collector", render):
+    start = time.perf_counter()
+    try:
+        return await render
+    finally:
+        collector.timing("render", time.perf_counter() - start)
+        if _renderer.cache is not None:
+            collector.cache("render", _renderer.cache.stats())
+
+
+async def plot(points: dict, no: int, collector: Optional["Collector"]=None) -> io.BytesIO:
+    """
+    Renders a graph. Render time and cache statistics are reported to ``collector``, if one is given.
+    """
+    if collector is not None:
+        return await _measured(collector, _renderer.render(points, no))
+
+    return await _renderer.render(points, no)
+
+
+async def plot_many(
+        points: Sequence[dict],
+        numbers: Sequence[int]=None,
+        overlay: bool=False,
+        collector: Optional["Collector"]=None
+) -> List[io.BytesIO]:
+    """
+    Renders several graphs in a single worker call. ``numbers`` labels each graph (defaulting to 1, 2, ...).
+    Returns one image per set of points, in order, or a single image with every graph overlaid if ``overlay`` is set.
+    """
+    if collector is not None:
+        return await _measured(collector, _renderer.render_many(points, numbers, overlay))
+
+    return await _renderer.render_many(points, numbers, overlay)
@@ -0,0 +1,64 @@
+"""
+Hooks for measuring where time goes while inputs are lexed, parsed, evaluated and rendered.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Union
+
+__all__ = "Collector", "Recorder"
+
+
+class Collector:
+    """
+    Receives measurements for a request. Attach one to a :class:`~mathparser.Parser` (``collector=``),
+    or pass it to :func:`mathparser.graph.plot`, and override whichever methods you need.
+    Without a collector, none of these measurements are taken.
+
+    Phases are ``"lex"``, ``"parse"``, ``"validate"``, ``"optimize"``, ``"evaluate"`` and ``"render"``.
+    """
+    def timing(self, phase: str, seconds: float):
+        """
+        Called each time a phase finishes. ``evaluate`` and ``render`` are reported once per expression/graph.
+        """
+
+    def counts(self, phase: str, counts: Dict[str, int]):
+        """
+        Called with operation counts for a phase, such as the ``steps`` and ``values`` used by an evaluation.
+        """
+
+    def cache(self, name: str, stats: Dict[str, Union[int, float]]):
+        """
+        Called with the current statistics of a cache used by the request (``"parse"``, ``"memo"``, ``"render"``).
+        """
+
+
+class Recorder(Collector):
+    """
+    A collector that totals everything it receives, for inspecting a request after the fact.
+    """
+    def __init__(self):
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.caches: Dict[str, Dict[str, Union[int, float]]] = {}
+
+    def timing(self, phase: str, seconds: float):
+        self.timings[phase] += seconds
+        self.calls[phase] += 1
+
+    def counts(self, phase: str, counts: Dict[str, int]):
+        for name, value in counts.items():
+            self.totals[phase][name] += value
+
+    def cache(self, name: str, stats: Dict[str, Union[int, float]]):
+        self.caches[name] = stats
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "timings": dict(self.timings),
+            "calls": dict(self.calls),
+            "counts": {phase: dict(counts) for phase, counts in self.totals.items()},
+            "caches": dict(self.caches),
+        }
+
+    def __repr__(self):
+        return f"<Recorder timings={dict(self.timings)}>"
@@ -1,17 +1,112 @@
 import re
-from sly.lex import Lexer, Token
+from typing import Iterator, List, Optional
+from sly.lex import Lexer
 
 from .errors import UserInputError, TokenizedUserInputError
+from .tokens import Token
 
-__all__ = "MathLexer", "ArgLexer"
+__all__ = "MathLexer", "CallGroup", "FunctionGroup", "PlotGroup", "SequenceGroup"
 
-def __token_eq(self, other):
-    return self.index == other.index
+_CALLABLE_NAME_RE = re.compile(r"[a-zA-Z]+")
+_SEQUENCE_CALLS = {
+    "?": "SEQUENCE_N_CALL",
+    "!": "SEQUENCE_S_CALL",
+    "!!": "SEQUENCE_SN_CALL",
+}
+
+
+class CallGroup:
+    """
+    The value of FUNCTION_CALL and SEQUENCE_*_CALL tokens.
+    ``args`` holds the (already grouped) tokens of each argument.
+    """
+    __slots__ = "name", "args", "text"
+
+    def __init__(self, name: str, args: List[List[Token]], text: str):
+        self.name = name
+        self.args = args
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<CallGroup name={self.name} args={self.args}>"
+
+
+class FunctionGroup:
+    """
+    The value of FUNCTION tokens (``p(x, y) = body``).
+    """
+    __slots__ = "name", "params", "body", "text"
+
+    def __init__(self, name: str, params: List[str], body: List[Token], text: str):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<FunctionGroup name={self.name} params={self.params} body={self.body}>"
+
+
+class PlotGroup:
+    """
+    The value of PLOT_FUNCTION tokens (``y = body``).
+    """
+    __slots__ = "body", "text"
+
+    def __init__(self, body: List[Token], text: str):
+        self.body = body
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<PlotGroup body={self.body}>"
+
+
+class SequenceGroup:
+    """
+    The value of SEQUENCE tokens (``s = n1, n2[, n3]``). ``values`` holds the tokens of each comma separated value.
+    """
+    __slots__ = "values", "text"
+
+    def __init__(self, values: List[List[Token]], text: str):
+        self.values = values
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<SequenceGroup values={self.values}>"
+
+
+class _Frame:
+    # an open bracket, call, or definition body while grouping tokens
+    __slots__ = "kind", "token", "type", "parts", "statement", "signature"
+
+    def __init__(self, kind: str, token: Token, type_: str=None, statement: bool=False):
+        self.kind = kind
+        self.token = token
+        self.type = type_
+        self.parts: Optional[List[List[Token]]] = [[]]
+        self.statement = statement # whether a call could turn out to be a definition
+        self.signature = None # the name and parameters of a definition
 
-Token.__eq__ = __token_eq
 
 # NoInspection PyUnresolvedReference
 class MathLexer(Lexer):
+    """
+    Tokenizes user input in a single pass. Calls, function definitions, graphed functions and sequences
+    are grouped as they are read into FUNCTION_CALL, SEQUENCE_*_CALL, FUNCTION, PLOT_FUNCTION and SEQUENCE tokens,
+    whose values (:class:`CallGroup` etc.) hold their already tokenized parts.
+    """
     tokens = {
         FUNCTION,
         PLOT_FUNCTION,
@@ -20,21 +115,16 @@ class MathLexer(Lexer):
         SEQUENCE_N_CALL,
         SEQUENCE_S_CALL,
         SEQUENCE_SN_CALL,
+        SEQUENCE_OP,
         NAME,
         NUMBER,
         NEWLINE
     }
     ignore = " \t"
-    literals = { "=", "(", ")" }
+    literals = { "=", "(", ")", "," }
 
     # Tokens
-    FUNCTION = r"([a-zA-Z]+)\(([a-zA-Z,\s]*)\)\s*=\s*(.*)"
-    PLOT_FUNCTION = r"y\s*=\s*(.*)"
-    SEQUENCE = r"[sS]\s*=\s*([^,\n]*),([^,\n]*),?([^,\n]*)?"
-    FUNCTION_CALL = r"([a-zA-Z]+)\s*\((.*)\)"
-    SEQUENCE_N_CALL = r"[sS]\s*\?\s*\((.*)\)"
-    SEQUENCE_S_CALL = r"[sS]\s*\!\s*\((.*)\)"
-    SEQUENCE_SN_CALL = r"[sS]\s*\!\!\s*\((.*)\)"
+    SEQUENCE_OP = r"!!|[?!]"
     NAME = r"[a-zA-Z_][a-zA-Z0-9_]*"
 
     @_(r"[+\-*/^]")
@@ -60,45 +150,141 @@ class MathLexer(Lexer):
     def error(self, t):
         raise TokenizedUserInputError(self.text, t, f"Invalid syntax: {t.value}")
 
-class ArgLexer(Lexer):
-    #def __init__(self, source: str):
-    #    self.source = source
-    #    super(ArgLexer, self).__init__()
+    def tokenize(self, text: str, lineno: int=1, index: int=0) -> Iterator[Token]:
+        raw = super().tokenize(text, lineno, index)
+        pushback: List[Token] = []
+        stack: List[_Frame] = []
+        statement_start = True
+        previous: Optional[Token] = None
 
-    tokens = { FUNCTION, FUNCTION_CALL, NAME, NUMBER, NEWLINE}
-    ignore = " \t"
-    literals = {"(", ")", ","}
+        def take() -> Optional[Token]:
+            if pushback:
+                return pushback.pop()
 
-    @_(r"S\s*=\s*([^,]*),([^,]*),?([^,]*)?")
-    def SEQUENCE(self, t: Token):
-        raise TokenizedUserInputError(self.text, t, "Sequences are not allowed here")
+            t = next(raw, None)
+            if t is not None:
+                t.__class__ = Token # same layout as sly's token, so this is much cheaper than copying it
 
-    @_(r"([a-zA-Z]+)\(([a-zA-Z,\s]*)\)\s*=\s*([a-zA-Z0-9^*/\-+\(\) \t]*)")
-    def FUNCTION(self, t: Token):
-        raise TokenizedUserInputError(self.text, t, "Functions are not allowed here")
+            return t
 
-    # Tokens
-    FUNCTION_CALL = r"([a-zA-Z]+)\((.*)\)"
-    NAME = r"[a-zA-Z_][a-zA-Z0-9_]*"
+        def emit(tok: Token):
+            if stack and stack[-1].parts is not None:
+                stack[-1].parts[-1].append(tok)
+            else:
+                ready.append(tok)
 
-    @_(r"[+\-*/^]")
-    def OPERATOR(self, t: Token):
-        return t
+        def group(frame: _Frame, end: Token, type_: str, value) -> Token:
+            start = frame.token
+            value.text = text[start.index:end.end]
+            return Token(type_, value, start.lineno, start.index, end.end)
 
-    @_(r"(\d|\.)+")
-    def NUMBER(self, t: Token):
-        if len(t.value) > 8:
-            raise TokenizedUserInputError(self.text, t, "Number is too large or too precise")
+        def close_statement():
+            # closes the definition (if any) at the bottom of the stack at the end of a line
+            for frame in stack:
+                if frame.kind != "body":
+                    raise TokenizedUserInputError(text, frame.token, "Unclosed bracket")
 
-        try:
-            t.value = float(t.value)
-        except:
-            raise TokenizedUserInputError(self.text, t, f"Invalid number: '{t.value}'")
-        return t
+            if stack:
+                frame = stack.pop()
+                if frame.type == "SEQUENCE":
+                    value = SequenceGroup(frame.parts, "")
+                elif frame.type == "PLOT_FUNCTION":
+                    value = PlotGroup(frame.parts[0], "")
+                else:
+                    name, params = frame.signature
+                    value = FunctionGroup(name, params, frame.parts[0], "")
 
-    @_(r",")
-    def NEWLINE(self, t):
-        return t
+                ready.append(group(frame, previous, frame.type, value))
+
+        while True:
+            ready: List[Token] = []
+            tok = take()
+            if tok is None:
+                break
+
+            if tok.type == "NAME":
+                nxt = take()
+                callable_name = _CALLABLE_NAME_RE.fullmatch(tok.value)
+
+                if nxt is not None and nxt.type == "(" and callable_name:
+                    stack.append(_Frame("call", tok, "FUNCTION_CALL", statement_start))
+
+                elif nxt is not None and nxt.type == "SEQUENCE_OP" and tok.value in ("s", "S"):
+                    bracket = take()
+                    if bracket is None or bracket.type != "(":
+                        raise TokenizedUserInputError(text, nxt, f"Invalid syntax: {nxt.value}")
+
+                    stack.append(_Frame("call", tok, _SEQUENCE_CALLS[nxt.value]))
+
+                elif nxt is not None and nxt.type == "=" and statement_start and not stack and tok.value in ("y", "s", "S"):
+                    stack.append(_Frame("body", tok, "PLOT_FUNCTION" if tok.value == "y" else "SEQUENCE"))
+                    tok = nxt
+
+                else:
+                    emit(tok)
+                    if nxt is not None:
+                        pushback.append(nxt)
+
+            elif tok.type == "(":
+                emit(tok)
+                # brackets are only tracked for matching, their tokens go wherever the bracket itself went
+                frame = _Frame("paren", tok)
+                frame.parts = [stack[-1].parts[-1]] if stack and stack[-1].parts is not None else None
+                stack.append(frame)
+
+            elif tok.type == ")":
+                if not stack or stack[-1].kind == "body":
+                    raise TokenizedUserInputError(text, tok, "Unexpected closing bracket")
+
+                frame = stack.pop()
+                if frame.kind == "paren":
+                    emit(tok)
+
+                else:
+                    args = frame.parts if frame.parts != [[]] else []
+                    nxt = take()
+                    if nxt is not None and nxt.type == "=" and frame.statement:
+                        if not all(len(arg) == 1 and arg[0].type == "NAME" for arg in args):
+                            raise TokenizedUserInputError(text, nxt, "Unexpected '='")
+
+                        body = _Frame("body", frame.token, "FUNCTION")
+                        body.signature = (frame.token.value, [arg[0].value for arg in args])
+                        stack.append(body)
+                        tok = nxt
+
+                    else:
+                        if nxt is not None:
+                            pushback.append(nxt)
+
+                        name = frame.token.value if frame.type == "FUNCTION_CALL" else "s"
+                        emit(group(frame, tok, frame.type, CallGroup(name, args, "")))
+
+            elif tok.type == ",":
+                if not stack or (stack[-1].kind != "call" and stack[-1].type != "SEQUENCE"):
+                    raise TokenizedUserInputError(text, tok, f"Invalid syntax: {text[tok.index:]}")
+
+                stack[-1].parts.append([])
+
+            elif tok.type == "NEWLINE":
+                close_statement()
+                ready.append(tok)
+
+            elif tok.type == "=":
+                raise TokenizedUserInputError(text, tok, "Unexpected '='")
+
+            elif tok.type == "SEQUENCE_OP":
+                raise TokenizedUserInputError(text, tok, f"Invalid syntax: {tok.value}")
+
+            else:
+                emit(tok)
+
+            statement_start = tok.type == "NEWLINE"
+            if not statement_start:
+                previous = tok
+
+            yield from ready
+
+        ready = []
+        close_statement()
+        yield from ready
 
-    def error(self, t):
-        raise TokenizedUserInputError(self.text, t, f"Invalid syntax: {t.value}")
\ No newline at end of file
@@ -0,0 +1,106 @@
+import math
+import time
+from typing import Optional
+
+from .errors import LimitError
+
+__all__ = "Budget",
+
+
+class Budget:
+    """
+    Limits how much work evaluating an input may do. Pass one to a :class:`~mathparser.Parser` as ``budget``.
+
+    Every compiled program charges its length (the number of operations it runs) and the size of its stack
+    each time it runs, and every function call counts towards the call depth while it runs.
+    Evaluation stops with a :class:`~mathparser.errors.LimitError` (a :class:`UserInputError`) once more than
+    ``max_steps`` operations have run, once more than ``max_values`` intermediate values have been allocated, once
+    calls are nested more than ``max_depth`` deep (or deeper than Python's recursion limit allows), ``timeout``
+    seconds after the budget was created (or :meth:`reset`), or once :meth:`cancel` has been called (from any
+    thread).
+    Every limit is optional, and checking them costs a few comparisons per program run and function call.
+    """
+    __slots__ = (
+        "max_steps",
+        "max_values",
+        "max_depth",
+        "timeout",
+        "deadline",
+        "steps",
+        "values",
+        "depth",
+        "cancelled",
+        "_step_limit",
+        "_value_limit",
+        "_depth_limit"
+    )
+
+    def __init__(
+            self,
+            max_steps: Optional[int]=None,
+            timeout: Optional[float]=None,
+            max_depth: Optional[int]=None,
+            max_values: Optional[int]=None
+    ):
+        self.max_steps = max_steps
+        self.max_values = max_values
+        self.max_depth = max_depth
+        self.timeout = timeout
+        # infinity stands in for no limit, so the common case is one comparison per limit
+        self._step_limit = max_steps if max_steps is not None else math.inf
+        self._value_limit = max_values if max_values is not None else math.inf
+        self._depth_limit = max_depth if max_depth is not None else math.inf
+        self.reset()
+
+    def __repr__(self):
+        return f"<Budget steps={self.steps} values={self.values} depth={self.depth}>"
+
+    def reset(self):
+        """
+        Clears the counters and restarts the timeout, so the budget can be used for another evaluation.
+        """
+        self.deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        self.steps = 0
+        self.values = 0
+        self.depth = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def charge(self, steps: int, values: int=0):
+        self.steps += steps
+        self.values += values
+        if self.steps <= self._step_limit and self.values <= self._value_limit and not self.cancelled \
+                and self.deadline is None:
+            return
+
+        if self.steps > self._step_limit:
+            raise LimitError(f"This input is too complex to evaluate (more than {self.max_steps} steps)")
+
+        if self.values > self._value_limit:
+            raise LimitError(f"This input needs too much memory to evaluate (more than {self.max_values} values)")
+
+        if self.cancelled:
+            raise LimitError("Evaluation was cancelled")
+
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise LimitError(f"Evaluation took longer than {self.timeout} seconds")
+
+    def enter(self):
+        self.depth += 1
+        if self.depth > self._depth_limit:
+            self.depth -= 1
+            raise self.too_deep()
+
+    def too_deep(self) -> LimitError:
+        """
+        The error for calls nested deeper than ``max_depth``, or than the interpreter's recursion limit.
+        """
+        if self.max_depth is None:
+            return LimitError("Functions are nested too deeply")
+
+        return LimitError(f"Functions are nested too deeply (more than {self.max_depth} calls)")
+
+    def leave(self):
+        self.depth -= 1
@@ -0,0 +1,193 @@
+from typing import Iterator, List, Tuple, Union
+from .tokens import Token
+
+__all__ = (
+    "Node",
+    "Num",
+    "Var",
+    "Neg",
+    "BinOp",
+    "Call",
+    "SeqCall",
+    "FuncDef",
+    "Plot",
+    "SeqDef",
+    "Hoisted",
+    "walk"
+)
+
+
+class Node:
+    """
+    Base class for the syntax tree built by :mod:`mathparser.grammar`.
+    ``token`` is the token errors point at, ``start`` and ``end`` are the node's span in the input.
+    """
+    __slots__ = "token", "start", "end"
+
+    def __init__(self, token: Token, start: int, end: int):
+        self.token = token
+        self.start = start
+        self.end = end
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        return self.start, self.end
+
+    def children(self) -> Tuple["Node", ...]:
+        return ()
+
+
+class Num(Node):
+    __slots__ = "value",
+
+    def __init__(self, token: Token, value: Union[int, float]):
+        super().__init__(token, token.index, token.end)
+        self.value = value
+
+    def __repr__(self):
+        return f"<Num {self.value}>"
+
+
+class Var(Node):
+    __slots__ = "name",
+
+    def __init__(self, token: Token):
+        super().__init__(token, token.index, token.end)
+        self.name = token.value
+
+    def __repr__(self):
+        return f"<Var {self.name}>"
+
+
+class Neg(Node):
+    __slots__ = "operand",
+
+    def __init__(self, token: Token, operand: Node):
+        super().__init__(token, token.index, operand.end)
+        self.operand = operand
+
+    def children(self):
+        return self.operand,
+
+    def __repr__(self):
+        return f"<Neg {self.operand!r}>"
+
+
+class BinOp(Node):
+    __slots__ = "op", "left", "right"
+
+    def __init__(self, op: "Operator", left: Node, right: Node):
+        super().__init__(op.token, left.start, right.end)
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def children(self):
+        return self.left, self.right
+
+    def __repr__(self):
+        return f"<BinOp {self.op.op} {self.left!r} {self.right!r}>"
+
+
+class Call(Node):
+    """
+    A call to a user defined or builtin function. ``token`` is the FUNCTION_CALL token.
+    """
+    __slots__ = "name", "args"
+
+    def __init__(self, token: Token, name: str, args: List[Node]):
+        super().__init__(token, token.index, token.end)
+        self.name = name
+        self.args = args
+
+    def children(self):
+        return tuple(self.args)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name} {self.args}>"
+
+
+class SeqCall(Call):
+    """
+    ``s(n)``, ``s?(tn)``, ``s!(n)`` or ``s!!(tn)``. The kind of query is the token's type.
+    """
+    __slots__ = ()
+
+    @property
+    def kind(self) -> str:
+        return self.token.type
+
+
+class FuncDef(Node):
+    __slots__ = "name", "params", "body"
+
+    def __init__(self, token: Token, name: str, params: List[str], body: Node):
+        super().__init__(token, token.index, token.end)
+        self.name = name
+        self.params = params
+        self.body = body
+
+    def children(self):
+        return self.body,
+
+    def __repr__(self):
+        return f"<FuncDef {self.name}({', '.join(self.params)}) {self.body!r}>"
+
+
+class Plot(Node):
+    __slots__ = "body",
+
+    def __init__(self, token: Token, body: Node):
+        super().__init__(token, token.index, token.end)
+        self.body = body
+
+    def children(self):
+        return self.body,
+
+    def __repr__(self):
+        return f"<Plot {self.body!r}>"
+
+
+class SeqDef(Node):
+    __slots__ = "values",
+
+    def __init__(self, token: Token, values: List[Node]):
+        super().__init__(token, token.index, token.end)
+        self.values = values
+
+    def children(self):
+        return tuple(self.values)
+
+    def __repr__(self):
+        return f"<SeqDef {self.values}>"
+
+
+class Hoisted(Node):
+    """
+    A sub-expression that appears more than once in a function body (see :mod:`mathparser.optimize`).
+    The ``first`` occurrence is evaluated and kept in temporary ``index``, every later one reuses the kept value.
+    """
+    __slots__ = "node", "index", "first"
+
+    def __init__(self, node: Node, index: int, first: bool):
+        super().__init__(node.token, node.start, node.end)
+        self.node = node
+        self.index = index
+        self.first = first
+
+    def children(self):
+        return (self.node,) if self.first else ()
+
+    def __repr__(self):
+        return f"<Hoisted {self.index} {self.node!r}>" if self.first else f"<Hoisted {self.index}>"
+
+
+def walk(node: Node) -> Iterator[Node]:
+    """
+    Yields ``node`` and every node beneath it, parents first.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children()))
@@ -0,0 +1,177 @@
+"""
+Optimization passes over the syntax tree, run once after an input has been validated.
+
+:func:`fold_constants` evaluates every sub-tree that doesn't depend on a variable (literals, ``pi``/``E``,
+and builtin calls on those). :func:`hoist_common` finds sub-expressions repeated within a function body,
+so they are only evaluated once per call.
+"""
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+from .errors import *
+from .nodes import *
+from .parse import Parser, BuiltinFunction
+
+__all__ = "fold_constants", "hoist_common", "optimize"
+
+# anything that folding a sub-tree raises is left for evaluation to raise, in the same place it always has
+_FOLD_ERRORS = INPUT_ERRORS + (TypeError,)
+
+
+def _post_order(root: Node) -> Iterator[Node]:
+    todo: List[Tuple[Node, bool]] = [(root, False)]
+    while todo:
+        node, visited = todo.pop()
+        children = node.children()
+        if visited or not children:
+            yield node
+        else:
+            todo.append((node, True))
+            todo.extend((child, False) for child in reversed(children))
+
+
+def _set_children(node: Node, children: Sequence[Node]):
+    if isinstance(node, BinOp):
+        node.left, node.right = children
+    elif isinstance(node, Neg):
+        node.operand, = children
+    elif isinstance(node, Call):
+        node.args = list(children)
+    elif isinstance(node, Hoisted):
+        node.node, = children
+
+
+def _constant(node: Node, value: Union[int, float]) -> Num:
+    const = Num(node.token, value)
+    const.start, const.end = node.start, node.end
+    return const
+
+
+def fold_constants(parser: Parser, root: Node, params: Sequence[str]=()) -> Node:
+    """
+    Returns ``root`` with its constant sub-trees replaced by their value. ``params`` are the names that
+    belong to the enclosing function (and so are never constant), even if they shadow a constant in the state.
+    Sub-trees that raise when folded (division by 0, limit violations) are left as they are.
+    """
+    folded: Dict[int, Node] = {}
+
+    for node in _post_order(root):
+        children = [folded.pop(id(child)) for child in node.children()]
+        if children:
+            _set_children(node, children)
+
+        result = node
+        if isinstance(node, Var):
+            value = parser.state.get(node.name)
+            if node.name not in params and isinstance(value, (int, float)):
+                result = _constant(node, value)
+
+        elif isinstance(node, Neg):
+            if isinstance(node.operand, Num):
+                result = _constant(node, -node.operand.value)
+
+        elif isinstance(node, BinOp):
+            if isinstance(node.left, Num) and isinstance(node.right, Num):
+                try:
+                    result = _constant(node, node.op.execute(parser, node.left.value, node.right.value))
+                except _FOLD_ERRORS:
+                    pass
+
+        elif isinstance(node, Call):
+            func = parser.state.get(node.name)
+            if isinstance(func, BuiltinFunction) and all(isinstance(arg, Num) for arg in node.args):
+                try:
+                    result = _constant(node, parser.call(node, [arg.value for arg in node.args]))
+                except _FOLD_ERRORS:
+                    pass
+
+        folded[id(node)] = result
+
+    return folded[id(root)]
+
+
+def _structure(root: Node) -> Dict[int, int]:
+    # numbers every node by its structure, so identical sub-trees share a number
+    numbers: Dict[int, int] = {}
+    interned: Dict[tuple, int] = {}
+
+    for node in _post_order(root):
+        if isinstance(node, Num):
+            key = (Num, repr(node.value))
+        elif isinstance(node, Var):
+            key = (Var, node.name)
+        elif isinstance(node, Neg):
+            key = (Neg, numbers[id(node.operand)])
+        elif isinstance(node, BinOp):
+            key = (BinOp, node.op.op, numbers[id(node.left)], numbers[id(node.right)])
+        elif isinstance(node, Call):
+            key = (Call, node.token.type, node.name, tuple(numbers[id(arg)] for arg in node.args))
+        else:
+            key = (type(node), id(node))
+
+        numbers[id(node)] = interned.setdefault(key, len(interned))
+
+    return numbers
+
+
+def hoist_common(root: Node) -> Tuple[Node, int]:
+    """
+    Wraps every sub-expression that is repeated in ``root`` in a :class:`~mathparser.nodes.Hoisted` node,
+    so that it is evaluated once and reused. Returns the new tree and the number of temporaries it needs.
+    """
+    numbers = _structure(root)
+    compound = (BinOp, Neg, Call)
+
+    # a sub-expression's first occurrence (in evaluation order) is the one that gets evaluated.
+    # repeats inside a later occurrence don't count, that whole occurrence is reused
+    seen = set()
+    repeated = set()
+    todo = [root]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, compound):
+            number = numbers[id(node)]
+            if number in seen:
+                repeated.add(number)
+                continue
+
+            seen.add(number)
+
+        todo.extend(reversed(node.children()))
+
+    if not repeated:
+        return root, 0
+
+    indexes: Dict[int, int] = {}
+    replaced: Dict[int, Node] = {}
+    todo = [root]
+    while todo:
+        node = todo.pop()
+        number = numbers[id(node)]
+        if isinstance(node, compound) and number in repeated:
+            if number in indexes:
+                replaced[id(node)] = Hoisted(node, indexes[number], False)
+                continue
+
+            indexes[number] = len(indexes)
+            replaced[id(node)] = Hoisted(node, indexes[number], True)
+
+        todo.extend(reversed(node.children()))
+
+    for node in _post_order(root):
+        children = node.children()
+        if any(id(child) in replaced for child in children):
+            _set_children(node, [replaced.get(id(child), child) for child in children])
+
+    return replaced.get(id(root), root), len(indexes)
+
+
+def optimize(parser: Parser, root: Node, params: Sequence[str]=None) -> Node:
+    """
+    Runs every pass over an expression, or a function body if ``params`` is given.
+    Common sub-expressions are only hoisted out of function bodies, which are evaluated repeatedly.
+    """
+    root = fold_constants(parser, root, params or ())
+    if params is not None:
+        root, _ = hoist_common(root)
+
+    return root
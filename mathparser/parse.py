@@ -1,20 +1,21 @@
-import re
+import io
 import math
-import copy
+import itertools
 import logging
-from typing import List, Union, Callable, Any, Optional
-from sly.lex import Token
-from .lex import ArgLexer
+from time import perf_counter
+from types import MappingProxyType
+from typing import List, Union, Callable, Any, Optional, Iterable, Iterator, AsyncIterable, AsyncIterator
+from .tokens import Token
 from .errors import *
-
-FUNCTION_RE = re.compile(r"([a-zA-Z]+)\(([a-zA-Z,\s]*)\)\s*=\s*(.*)") # P(x) = expr
-PLOT_FUNCTION_RE = re.compile(r"y\s*=\s*(.*)")
-SEQUENCE_RE = re.compile(r"[sS]\s*=\s*([^,\n]*),([^,\n]*),?([^,\n]*)?")
-FUNCTIONCALL_RE = re.compile(r"([a-zA-Z]+)\s*\((.*)\)") # P(x[, y,...])
-SEQUENCE_X_RE = re.compile(r"[sS]\s*[?!]!?\s*\((.*)\)") # s?|!|!!(400)
+from .nodes import Node, Call, Var, FuncDef, Plot, SeqDef, walk
+from .plotting import PlotOptions, adaptive_points
+from .limits import Budget
 
 MAX_ALLOWABLE_NUMBER = 99999999
 MAX_EXPONENT = 50
+_MISSING = object()
+# state versions are unique across every parser, so results cached against one state are never used with another
+_state_versions = itertools.count()
 
 logger = logging.getLogger("mathparser")
 
@@ -23,11 +24,11 @@ class Builtins:
         _num = ["num"]
         _num2 = ["num", "num2"]
         def _unwrap(func: Callable):
-            def call(_, **kwargs):
-                return func(*kwargs.values())
+            def call(_, *args):
+                return func(*args)
 
             return call
-        self.builtins = {
+        self.builtins = MappingProxyType({
             "rad": BuiltinFunction("rad", _num, _unwrap(math.radians)),
             "sin": BuiltinFunction("sin", _num, _unwrap(math.sin)),
             "cos": BuiltinFunction("cos", _num, _unwrap(math.cos)),
@@ -39,209 +40,307 @@ class Builtins:
             "π": math.pi,
             "pi": math.pi,
             "E": math.e,
-        }
+        }) # shared by every parser, so it must never change
+
+
+class Scope(dict):
+    """
+    A parser's definitions, layered over the shared builtins. Names that aren't defined here are looked up in ``base``,
+    but setting, deleting and iterating only ever touch the parser's own definitions, so the builtins are never copied.
+    """
+    __slots__ = "base",
+
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+
+    def __missing__(self, key):
+        return self.base[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.base
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"<Scope {dict.__repr__(self)}>"
+
 
 class Parser:
-    def __init__(self, user_input, lex):
+    def __init__(
+            self,
+            user_input,
+            lex,
+            plot_options: PlotOptions=None,
+            optimize: bool=True,
+            memo: Union[int, "LRUCache", None]=None,
+            budget: Optional[Budget]=None,
+            collector: Optional["Collector"]=None
+    ):
         self.input = user_input
         self.lex = lex
-        self.state = BUILTINS.builtins.copy()
+        self.plot_options = plot_options or PlotOptions()
+        self.optimize = optimize
+        if isinstance(memo, int):
+            from .cache import LRUCache
+            memo = LRUCache(max_entries=memo)
+
+        self.memo: Optional["LRUCache"] = memo
+        self.collector = collector
+        if collector is not None and budget is None:
+            budget = Budget() # without limits, it only counts what evaluation does for the collector
+
+        self.budget = budget
+        self.state = Scope(BUILTINS.builtins)
         self.tokens: Optional[List[Token]] = None
         self.sequence: Optional["GeoSequence"] = None
+        self.state_version = next(_state_versions)
 
-    def parse(self, tokens: List[Token]):
-        self.tokens = tokens
-        expr = self.traverse_tokens(allow_functions=True)
-        return expr
-
-    def traverse_tokens(self, tokens: List[Token]=None, allow_functions=True):
-        exprs = [Expression()]
-        functioncalls = []
-        bracket = None
-        depth = 0
-        tokens = tokens or self.tokens
-        last_token = None
-        skip = 0
-
-        for index, token in enumerate(tokens):
-            if skip:
-                skip -= 1
-                continue
-
-            if token.type in ("NUMBER", "NAME"):
-                last_token = token
-                if bracket:
-                    bracket.add_chunk(token)
-                else:
-                    exprs[-1].add_chunk(token)
+    def reset(self, user_input: str=""):
+        """
+        Forgets every definition, sequence and token, so the parser can be used for another input.
+        The lexer, options, memo and budget are kept (the budget is reset). This doesn't depend on how much was defined.
+        """
+        self.input = user_input
+        self.state = Scope(BUILTINS.builtins)
+        self.tokens = None
+        self.sequence = None
+        self.state_version = next(_state_versions)
+        if self.budget is not None:
+            self.budget.reset()
+
+    def define(self, name: str, value: Any):
+        """
+        Sets a name in the parser state. Memoized calls made before it aren't reused, and expressions that were
+        already parsed check the functions they call against the new state when they run.
+        """
+        self.state[name] = value
+        self.state_version = next(_state_versions)
 
-                continue
+    def parse(self, tokens: Iterable[Token]) -> List[Union["Expression", "PlottableFunction"]]:
+        collector = self.collector
+        start = perf_counter() if collector is not None else 0.0
+        if not isinstance(tokens, list):
+            tokens = list(tokens) # given lex.tokenize() directly, this is where lexing happens
+            if collector is not None:
+                start = self._lap("lex", start)
 
-            elif token.type == "OPERATOR":
-                if not last_token and token.value != "-":
-                    raise TokenizedUserInputError(self.input, token, "Unexpected operator")
+        self.tokens = tokens
+        exprs = []
+        for node in iter_statements(self.input, tokens):
+            expr = self.add_statement(node)
+            if expr is not None:
+                exprs.append(expr)
 
-                if last_token and last_token.type == "OPERATOR":
-                    raise TokenizedUserInputError(self.input, token, "Unexpected operator")
+        if collector is not None:
+            start = self._lap("parse", start)
 
-                if token.value == "-" and last_token and last_token.value == "-":
-                    _token = copy.copy(token)
-                    _token.value = "+"
-                    if bracket:
-                        bracket.tokens.pop()
-                        bracket.tokens.append(Operator(_token))
-                    else:
-                        exprs[-1].chunks.pop()
-                        exprs[-1].chunks.append(Operator(_token))
+        if self.sequence:
+            self.sequence.validate(self)
 
-                    last_token = token
-                    continue
+        for x in self.state.values():
+            if isinstance(x, Function):
+                x.validate(self)
 
-                elif last_token and last_token.value == token.value:
-                    raise TokenizedUserInputError(self.input, token, f"Unexpected '{token.value}'")
+        for expr in exprs:
+            expr.validate(self)
 
-                token = Operator(token)
-                last_token = token
-                if bracket:
-                    bracket.add_chunk(token)
-                else:
-                    exprs[-1].add_chunk(token)
-
-                continue
-
-            elif token.type == "(":
-                depth += 1
-                if depth == 1:
-                    last_token = token
-                    bracket = Bracket(token)
-                    continue
-
-            elif token.type == ")":
-                depth -= 1
-                if depth == 0:
-                    last_token = token
-                    exprs[-1].add_chunk(bracket)
-                    bracket = None
-                    continue
-
-                if depth < 0:
-                    raise TokenizedUserInputError(self.input, token, "Unexpected closing bracket")
-
-            elif token.type == "FUNCTION":
-                if not allow_functions:
-                    raise TokenizedUserInputError(self.input, token, "Functions are not allowed here")
-
-                groups = FUNCTION_RE.match(token.value)
-                name, args, value = groups.groups()
-                f = Function(name, args, self.traverse_tokens(
-                    list(self.lex.tokenize(
-                        value, #lineno=token.lineno, index=token.index+offset
-                    )), allow_functions=False)[0].chunks
-                )
-
-                self.state[f.name] = f
-                last_token = f
-                try:
-                    if tokens[index+1].type == "NEWLINE":
-                        skip += 1
-                except IndexError:
-                    pass
-
-                continue
-
-            elif token.type == "NEWLINE":
-                exprs.append(Expression())
-                continue
-
-            elif token.type == "FUNCTION_CALL":
-                toks = FUNCTIONCALL_RE.match(token.value)
-                name, args = toks.groups()
-                args = self.parse_args(token, token.value.find("("), args)
-                f = FunctionCall(token, name, args)
-                last_token = f
-                exprs[-1].add_chunk(f)
-                functioncalls.append(f)
-                continue
-
-            elif token.type in ("SEQUENCE_N_CALL", "SEQUENCE_S_CALL", "SEQUENCE_SN_CALL"):
-                toks = SEQUENCE_X_RE.match(token.value)
-                args = toks.groups()[0]
-                args = self.parse_args(token, token.value.find("("), args)
-                f = FunctionCall(token, "s", args)
-                last_token = f
-                exprs[-1].add_chunk(f)
-                functioncalls.append(f)
-                continue
-
-            elif token.type == "PLOT_FUNCTION":
-                if not allow_functions:
-                    raise TokenizedUserInputError(self.input, token, "Functions are not allowed here")
-
-                groups = PLOT_FUNCTION_RE.match(token.value)
-                value = groups.groups()[0]
-                f = PlottableFunction("y", ["x"], self.traverse_tokens(list(self.lex.tokenize(value)), allow_functions=False)[0].chunks)
-
-                exprs.append(f)
-                last_token = f
-                try:
-                    if tokens[index+1].type == "NEWLINE":
-                        skip += 1
-                except IndexError:
-                    pass
-
-                continue
-
-            elif token.type == "SEQUENCE":
-                if not allow_functions:
-                    raise TokenizedUserInputError(self.input, token, "Sequences are not allowed here")
-
-                if "S" in self.state:
-                    raise TokenizedUserInputError(self.input, token, "A sequence has already been defined")
-
-                groups = SEQUENCE_RE.match(token.value)
-                attrs = list(groups.groups())
-                self.sequence = seq = GeoSequence(token, attrs)
-                fn = SequenceFunction(seq)
-                self.state['S'] = self.state['s'] = fn
-                continue
-
-            else:
-                raise ValueError(f"Unexpected token {token!r}")
-
-        for call in functioncalls:
-            call.validate(self)
-
-        if allow_functions:
-            if self.sequence:
-                self.sequence.validate(self)
+        if collector is not None:
+            start = self._lap("validate", start)
 
+        if self.optimize:
             for x in self.state.values():
-                try:
-                    x.validate(self)
-                except AttributeError:
-                    pass
+                if isinstance(x, Function) and x.body is not None:
+                    x.optimize(self)
 
-        for expr in exprs.copy():
-            expr.validate(self)
-            if not expr.chunks:
-                exprs.remove(expr)
+            for expr in exprs:
+                expr.optimize(self)
+
+            if collector is not None:
+                self._lap("optimize", start)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed %d expression(s) from %d token(s) of %r", len(exprs), len(tokens), self.input)
 
         return exprs
 
-    def parse_args(self, _, __, args: str):
-        tokens = list(ArgLexer().tokenize(args))
-        v = self.traverse_tokens(tokens, allow_functions=False)
-        args = [x for x in v if (isinstance(x, Token) and x.type != ",") or not isinstance(x, Token)]
-        return args
+    def _lap(self, phase: str, start: float) -> float:
+        now = perf_counter()
+        self.collector.timing(phase, now - start)
+        return now
+
+    def measure_evaluation(self, evaluate: Callable, *args) -> Any:
+        """
+        Calls ``evaluate(*args)``, reporting how long it took, the steps and values it used, and the state of the
+        call memo to the parser's collector.
+        """
+        collector = self.collector
+        budget = self.budget
+        steps, values = budget.steps, budget.values
+        start = perf_counter()
+        try:
+            return evaluate(*args)
+        finally:
+            collector.timing("evaluate", perf_counter() - start)
+            collector.counts("evaluate", {"steps": budget.steps - steps, "values": budget.values - values})
+            if self.memo is not None:
+                collector.cache("memo", self.memo.stats())
+
+    def add_statement(self, node: Node) -> Optional[Union["Expression", "PlottableFunction"]]:
+        """
+        Adds a parsed line to the parser. Definitions are added to the state, anything that can be executed is returned.
+        """
+        if isinstance(node, FuncDef):
+            self.define(node.name, Function(node.name, node.params, node.body))
+            return None
+
+        elif isinstance(node, Plot):
+            return PlottableFunction("y", ["x"], node.body)
+
+        elif isinstance(node, SeqDef):
+            if "S" in self.state:
+                raise TokenizedUserInputError(self.input, node.token, "A sequence has already been defined")
+
+            self.sequence = seq = GeoSequence(node.token, node.values)
+            fn = SequenceFunction(seq)
+            self.define("S", fn)
+            self.define("s", fn)
+            return None
+
+        return Expression(node)
+
+    def stream(self, lines: Union[str, Iterable[str]]) -> Iterator["LineResult"]:
+        """
+        Parses and evaluates input one line at a time, yielding a :class:`LineResult` as soon as each line
+        with a value (expressions and graphed functions), or that raised, has been evaluated.
+        Functions and sequences defined on earlier lines stay in scope, but nothing else is kept between lines,
+        so ``lines`` (a string, or any iterable of lines, such as an open file) can be as long as it needs to be.
+        Errors are reported against the line they happened on, and a definition that fails is discarded.
+        """
+        if isinstance(lines, str):
+            lines = io.StringIO(lines)
+
+        for lineno, line in enumerate(lines, 1):
+            result = self._stream_line(lineno, line.rstrip("\r\n"))
+            if result is not None:
+                yield result
+
+    async def astream(self, lines: Union[str, Iterable[str], AsyncIterable[str]]) -> AsyncIterator["LineResult"]:
+        """
+        The asynchronous form of :meth:`stream`, which also accepts an async iterable of lines.
+        Control is handed back to the event loop after every line.
+        """
+        import asyncio # only needed here, and slow to import
+
+        if isinstance(lines, str):
+            lines = io.StringIO(lines)
+
+        if not hasattr(lines, "__aiter__"):
+            lines = _aiter(lines)
+
+        lineno = 0
+        async for line in lines:
+            lineno += 1
+            result = self._stream_line(lineno, line.rstrip("\r\n"))
+            if result is not None:
+                yield result
+
+            await asyncio.sleep(0)
+
+    def _stream_line(self, lineno: int, line: str) -> Optional["LineResult"]:
+        if not line.strip():
+            return None
+
+        self.input = line
+        value = _MISSING
+        try:
+            self.tokens = list(self.lex.tokenize(line))
+            for node in iter_statements(line, self.tokens):
+                value = self._evaluate_statement(node)
+        except INPUT_ERRORS as e:
+            return LineResult(lineno, line, None, e)
+
+        return LineResult(lineno, line, value, None) if value is not _MISSING else None
+
+    def _evaluate_statement(self, node: Node) -> Any:
+        # validates, optimizes and evaluates a single statement for stream()
+        if isinstance(node, FuncDef):
+            names = node.name,
+        elif isinstance(node, SeqDef):
+            names = "S", "s"
+        else:
+            names = ()
+
+        previous = {name: self.state.get(name, _MISSING) for name in names}
+        sequence = self.sequence
+        expr = self.add_statement(node)
+
+        if expr is not None:
+            target = expr
+        elif isinstance(node, SeqDef):
+            target = self.sequence
+        else:
+            target = self.state[node.name]
+
+        try:
+            target.validate(self)
+        except Exception:
+            for name, value in previous.items():
+                if value is _MISSING:
+                    del self.state[name]
+                else:
+                    self.state[name] = value
+
+            self.sequence = sequence
+            self.state_version = next(_state_versions)
+            raise
+
+        if self.optimize and not isinstance(target, GeoSequence):
+            target.optimize(self)
+
+        return expr.execute(None, self) if expr is not None else _MISSING
+
+    def validate_node(self, node: Node, params: List[str]=None):
+        """
+        Checks that every call in ``node`` refers to a function, with the right number of arguments.
+        If ``params`` is given (ie. ``node`` is a function body), variables must also be parameters or exist in the state.
+        """
+        for child in walk(node):
+            if isinstance(child, Call):
+                self.resolve_call(child, len(child.args))
+
+            elif params is not None and isinstance(child, Var):
+                if child.name not in params and child.name not in self.state:
+                    raise TokenizedUserInputError(self.input, child.token, f"Unknown variable: '{child.name}'")
+
+    def resolve_call(self, node: Call, argc: int) -> "Function":
+        """
+        Returns the function ``node`` calls, checking that it exists and takes ``argc`` arguments.
+        """
+        func = self.state.get(node.name)
+        if not isinstance(func, Function):
+            raise TokenizedUserInputError(self.input, node.token, f"Function '{node.name}' not found")
+
+        if len(func.args) != argc:
+            raise TokenizedUserInputError(
+                self.input,
+                node.token,
+                f"{'Not enough' if len(func.args)>argc else 'Too many'} arguments passed to {node.name}"
+            )
+
+        return func
 
     def get_var_with_state(self, var: Token, namespace: dict=None):
         if namespace and var.value in namespace:
             return namespace[var.value]
 
-        if var.value in self.state.keys():
-            v = self.state[var.value]
-            if isinstance(v, (int, float)):
-                return v
+        v = self.state.get(var.value)
+        if isinstance(v, (int, float)):
+            return v
 
         raise TokenizedUserInputError(self.input, var, f"Variable '{var.value}' does not exist")
 
@@ -253,90 +352,143 @@ class Parser:
 
         raise UserInputError(f"Variable '{var}' does not exist")
 
-    def _quick_call(self, seq: List[Union["Bracket", Token, "Operator", "FunctionCall"]], namespace: dict):
-        v = seq[-1]
-        if isinstance(v, (int, float)):
-            return v
-        elif isinstance(v, str):
-            return self.get_var(v, namespace)
-        elif isinstance(v, Token):
-            if v.type == "NUMBER":
-                return v.value
-
-            return self.get_var_with_state(v, namespace)
-        elif isinstance(v, (FunctionCall, Bracket)):
-            return v.execute(self, namespace)
-
-        raise RuntimeError(f"unable to determine types. {v!r}")
-
-    def do_math(self, seq: List[Union["Bracket", Token, "Operator", "FunctionCall"]], namespace: dict):
-        logger.debug("----START-----")
-        logger.debug(namespace, seq)
-        if len(seq) < 3:
-            logger.debug("----QUICKCALL-END----")
-            return self._quick_call(seq, namespace)
-
-        ops = _ops = []
-        # loop one, solve brackets/function calls, abstract down to numbers
-        for i in seq:
-            if isinstance(i, Bracket):
-                ops.append(self.do_math(i.tokens, namespace))
-            elif isinstance(i, FunctionCall):
-                ops.append(i.execute(self, namespace))
-            elif isinstance(i, Token):
-                ops.append(i.value)
-            else:
-                ops.append(i)
-
-        # loop through for each operator to apply bedmas
-        logger.debug(ops)
-        for operator in ("^", "/", "*", "+", "-"):
-            it = iter(enumerate(ops))
-            new = []
-            for i, left in it:
-                if isinstance(left, Operator):
-                    if left.op == operator:
-                        op = left
-                        left = new.pop()
-                    else:
-                        logger.debug(i, left, new, ops, _ops)
-                        new.append(left)
-                        continue
-                else:
-                    try:
-                        _, op = next(it)
-                    except StopIteration:
-                        if isinstance(left, str):  # variable
-                            left = self.get_var(left, namespace)
+    def call(self, node: Call, values: List[Union[int, float]]):
+        budget = self.budget
+        if budget is None:
+            return self._call(node, values)
 
-                        new.append(left)
-                        continue
+        budget.enter()
+        try:
+            return self._call(node, values)
+        except RecursionError:
+            # python's own limit was reached before max_depth (or there isn't one), which is the same limit to the user
+            raise budget.too_deep() from None
+        finally:
+            budget.leave()
+
+    def _call(self, node: Call, values: List[Union[int, float]]):
+        func = self.state[node.name] # compiled call sites are checked against the current state before they run
+        memo = self.memo
+        if memo is None or isinstance(func, SequenceFunction):
+            return func.call(node.token, self, values)
+
+        if isinstance(func, BuiltinFunction):
+            key = (func, tuple(values)) # builtins are pure, so a call is answered by the function and its arguments alone
+        else:
+            # user functions also depend on whatever they call, which can be redefined, so the state is part of the key
+            key = (func, self.state_version, tuple(values))
+        result = memo.get(key, _MISSING)
+        if result is _MISSING:
+            result = func.call(node.token, self, values)
+            memo.put(key, result)
+
+        return result
+
+    def memo_stats(self) -> Optional[dict]:
+        """
+        Hit/miss/eviction counters for the function call memo, or None if calls aren't memoized.
+        """
+        return self.memo.stats() if self.memo is not None else None
+
+    def do_math(self, node: Node, namespace: dict):
+        slots = tuple(namespace) if namespace else ()
+        return compile_node(self, node, slots).execute(self, namespace)
+
+    def evaluate_many(
+            self,
+            function: Union[str, "Function"],
+            rows: Iterable[Any],
+            errors: str="raise",
+            vectorized: bool=False
+    ) -> Union[List[Union[int, float]], "numpy.ndarray"]:
+        """
+        Evaluates ``function`` (a :class:`Function`, or the name of one) once for every row of arguments in ``rows``.
+        ``rows`` is an iterable of argument tuples (or plain numbers, for single argument functions),
+        or a numpy array with one column per argument.
+
+        ``errors`` decides what happens to a row that raises (division by 0, numbers that are too large, math domain
+        errors): ``"raise"`` the error, ``"skip"`` the row, or return ``"nan"`` in its place. Going over the parser's
+        budget is never a single row's error, and always raises a :class:`LimitError`.
+        Returns a list, or a numpy array if ``rows`` is one. With ``vectorized``, every row is evaluated at once
+        with numpy (see :mod:`mathparser.vector`), where non-finite results also count as errors.
+        """
+        if errors not in ("raise", "skip", "nan"):
+            raise ValueError(f"Unknown error policy '{errors}'")
+
+        if isinstance(function, str):
+            function = self.get_var(function)
+
+        if not isinstance(function, Function) or isinstance(function, (SequenceFunction, PlottableFunction)):
+            raise TypeError(f"{function!r} cannot be evaluated in bulk")
+
+        if vectorized and function.body is not None:
+            from .vector import evaluate_rows
+            return evaluate_rows(function, self, rows, errors)
+
+        is_array = hasattr(rows, "ndim")
+        if is_array:
+            rows = rows.tolist()
+
+        argc = len(function.args)
+        if function.body is not None:
+            # the program's slots are the function's arguments, so a row is already a frame
+            run = function.compile(self).run
+            evaluate = lambda row: run(self, row)
+        else:
+            evaluate = lambda row: function.call(None, self, row)
+
+        results = []
+        for row in rows:
+            if not isinstance(row, (tuple, list)):
+                row = (row,)
 
-                    assert isinstance(op, Operator), AssertionError(left, op, new, ops, _ops)
-                    if op.op != operator:
-                        new.append(left)
-                        new.append(op)
-                        continue
+            if len(row) != argc:
+                raise ValueError(f"Expected {argc} arguments for {function.name}, got {len(row)}")
 
-                _, right = next(it)
-                if isinstance(right, str): #variable
-                    right = self.get_var(right, namespace)
+            try:
+                results.append(evaluate(row))
+            except LimitError:
+                raise
+            except INPUT_ERRORS:
+                if errors == "raise":
+                    raise
+                elif errors == "nan":
+                    results.append(math.nan)
+
+        if is_array:
+            import numpy
+            return numpy.asarray(results, dtype=float)
+
+        return results
+
+
+class LineResult:
+    """
+    A line evaluated by :meth:`Parser.stream`. ``value`` is the line's result (a dict of points for graphed functions),
+    unless it raised, in which case ``error`` is the exception. ``lineno`` counts from 1, including blank lines.
+    """
+    __slots__ = "lineno", "line", "value", "error"
+
+    def __init__(self, lineno: int, line: str, value: Any, error: Optional[Exception]):
+        self.lineno = lineno
+        self.line = line
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
-                if isinstance(left, str): #variable
-                    left = self.get_var(left, namespace)
+    def __repr__(self):
+        if self.error is not None:
+            return f"<LineResult lineno={self.lineno} error={self.error!r}>"
 
-                logger.debug(left, right)
-                value = op.execute(self, left, right)
-                new.append(value)
+        return f"<LineResult lineno={self.lineno} value={self.value!r}>"
 
-            logger.debug(new, ops)
-            ops = new
-            if len(ops) == 1:
-                break
 
-        logger.debug(ops)
-        logger.debug("----END----")
-        return ops[0]
+async def _aiter(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    for x in iterable:
+        yield x
 
 
 class Operator:
@@ -370,114 +522,49 @@ class Operator:
         return self.OPS[self.op](left, right)
 
 class Expression:
-    __slots__ = "chunks",
+    __slots__ = "node", "_program"
     value = None
     type = None
     plot = False
 
-    def __init__(self):
-        self.chunks = [] # type: List[Union[Bracket, Token, Operator, FunctionCall]]
-
-    def add_chunk(self, obj: Union["Bracket", Token, Operator, "FunctionCall"]):
-        if self.chunks:
-            if isinstance(obj, Token) and obj.type in ("NUMBER", "NAME"):
-                t = Token()
-                t.value = "*"
-                t.index = obj.index
-                t.lineno = obj.lineno
-                t.type = "OPERATOR"
-                if isinstance(self.chunks[-1], Token) and self.chunks[-1].type in ("NUMBER", "NAME"):
-                    self.chunks.append(Operator(t))
-
-                elif isinstance(self.chunks[-1], Bracket):
-                    self.chunks.append(Operator(t))
-
-            elif isinstance(obj, Bracket):
-                if isinstance(self.chunks[-1], Token) and self.chunks[-1].type in ("NUMBER", "NAME"):
-                    t = Token()
-                    t.value = "*"
-                    t.index = obj.start.index
-                    t.lineno = obj.start.lineno
-                    t.type = "OPERATOR"
-                    self.chunks.append(Operator(t))
-
-        self.chunks.append(obj)
-
-    def validate(self, _: Parser):
-        def _t(t0, t1, x):
-            if isinstance(t0, Operator) and t0.op == "-" and isinstance(t1, Token) and t1.type == "NUMBER":
-                t1.value *= -1
-                t1.index -= t1.index - t0.token.index
-                x[0] = t1
-                del x[1]
-
-        if len(self.chunks) > 1:
-            t0_ = self.chunks[0]
-            t1_ = self.chunks[1]
-            _t(t0_, t1_, self.chunks)
-
-        if self.chunks and isinstance(self.chunks[0], Bracket) and len(self.chunks[0].tokens)>1:
-            t0_ = self.chunks[0].tokens[0]
-            t1_ = self.chunks[0].tokens[1]
-            _t(t0_, t1_, self.chunks[0].tokens)
+    def __init__(self, node: Node):
+        self.node = node
+        self._program = None
 
-    def execute(self, _: Any, parser: Parser, namespace: dict=None):
-        return parser.do_math(self.chunks, namespace)
+    def validate(self, parser: Parser):
+        parser.validate_node(self.node)
 
-    def __repr__(self):
-        return f"<Expression {self.chunks}>"
+    def optimize(self, parser: Parser):
+        self.node = optimize_node(parser, self.node)
+        self._program = None
 
+    def compile(self, parser: Parser) -> "Program":
+        if self._program is None:
+            self._program = compile_node(parser, self.node)
 
-class Bracket:
-    __slots__ = "tokens", "start"
-    value = None
-    type = None
+        return self._program
+
+    def execute(self, _: Any, parser: Parser, namespace: dict=None):
+        if parser.collector is not None:
+            return parser.measure_evaluation(self._execute, parser, namespace)
+
+        return self._execute(parser, namespace)
+
+    def _execute(self, parser: Parser, namespace: Optional[dict]):
+        if namespace:
+            return parser.do_math(self.node, namespace)
 
-    def __init__(self, start: Token):
-        self.tokens = []
-        self.start = start
-
-    def add_chunk(self, obj: Union["Bracket", Token, Operator, "FunctionCall"]):
-        if self.tokens:
-            if isinstance(obj, Token) and obj.type in ("NUMBER", "NAME"):
-                t = Token()
-                t.value = "*"
-                t.index = obj.index
-                t.lineno = obj.lineno
-                t.type = "OPERATOR"
-                if isinstance(self.tokens[-1], Token) and self.tokens[-1].type in ("NUMBER", "NAME"):
-                    self.tokens.append(Operator(t))
-
-                elif isinstance(self.tokens[-1], Bracket):
-                    self.tokens.append(Operator(t))
-
-            elif isinstance(obj, Bracket):
-                if isinstance(self.tokens[-1], Token) and self.tokens[-1].type in ("NUMBER", "NAME"):
-                    t = Token()
-                    t.value = "*"
-                    t.index = obj.start.index
-                    t.lineno = obj.start.lineno
-                    t.type = "OPERATOR"
-                    self.tokens.append(Operator(t))
-
-        self.tokens.append(obj)
-
-    def execute(self, parser: Parser, namespace: dict=None):
-        expr = parser.traverse_tokens(self.tokens, allow_functions=False)
-        if len(expr) > 1:
-            raise TokenizedUserInputError(parser.input, self.start, "Invalid Syntax (multi-expr)")
-        expr = expr[0]
-
-        return parser.do_math(expr.chunks, namespace)
+        return self.compile(parser).run(parser, ())
 
     def __repr__(self):
-        return f"<Bracket {self.tokens}>"
+        return f"<Expression {self.node!r}>"
+
 
 class GeoSequence:
     __slots__ = "values", "geometric", "t", "d", "token"
     value = None
 
-    def __init__(self, token: Token, values: List[str]):
+    def __init__(self, token: Token, values: List[Node]):
         self.values = values
         self.token = token
         self.geometric: bool = None # noqa
@@ -485,25 +572,36 @@ class GeoSequence:
         self.d: float = None # noqa
 
     def validate(self, parser: Parser):
-        if len(self.values) < 2:
+        if not 2 <= len(self.values) <= 3:
             raise TokenizedUserInputError(parser.input, self.token, f"Expected 2-3 sequence values, got {len(self.values)}")
 
-        arg1 = parser.parse_args(None, None, self.values[0])[0].execute(None, parser)
+        for node in self.values:
+            parser.validate_node(node)
+
+        arg1 = parser.do_math(self.values[0], None)
         if int(arg1) == arg1:
             arg1 = int(arg1)
 
-        arg2 = parser.parse_args(None, None, self.values[1])[0].execute(None, parser)
+        arg2 = parser.do_math(self.values[1], None)
         if int(arg2) == arg2:
             arg2 = int(arg2)
 
         arg3 = None
 
-        if self.values[2]:
-            arg3 = parser.parse_args(None, None, self.values[2])[0].execute(None, parser)
+        if len(self.values) > 2:
+            arg3 = parser.do_math(self.values[2], None)
             if int(arg3) == arg3:
                 arg3 = int(arg3)
 
         self.t = arg1
+        self.geometric = True
+
+        # three values can also make an arithmetic sequence. constant ones (3,3,3) are geometric, with a ratio of 1
+        if arg3 is not None and arg3 - arg2 == arg2 - arg1 and (0 in (arg1, arg2) or arg3 / arg2 != arg2 / arg1):
+            self.geometric = False
+            self.d = arg2 - arg1
+            return
+
         self.d = arg2 / arg1
 
         if arg3 and arg3 / arg2 != self.d:
@@ -519,7 +617,7 @@ class GeoSequence:
 
         return self._EXECUTIONS[token.type](self, token, parser, value) # noqa
 
-    def _execute_n_tn(self, token: Token, parser: Parser, value: Union[int, float]) -> Union[int, float]:
+    def _check_exponent(self, token: Token, parser: Parser, value: Union[int, float]):
         if value > MAX_EXPONENT:
             raise TokenizedUserInputError(
                 parser.input,
@@ -527,22 +625,50 @@ class GeoSequence:
                 f"Exponents are restricted to {MAX_EXPONENT} (got {value})"
             )
 
-        return self.t * (self.d ** (value - 1))
-
-    def _execute_tn_n(self, _: Token, __: Parser, value: Union[int, float]) -> Union[int, float]:
-        return (math.log(value / self.t) / math.log(self.d)) + 1
+    @property
+    def constant(self) -> bool:
+        """
+        Whether every term is the same (a ratio of 1, or a difference of 0), so a term doesn't have a position.
+        """
+        return self.d == (1 if self.geometric else 0)
 
-    def _execute_n_sm(self, token: Token, parser: Parser, value: Union[int, float]) -> Union[int, float]:
-        if value > MAX_EXPONENT:
+    def _check_positions(self, token: Token, parser: Parser):
+        if self.constant:
             raise TokenizedUserInputError(
                 parser.input,
                 token,
-                f"Exponents are restricted to {MAX_EXPONENT} (got {value})"
+                f"Every term of this sequence is {self.t}, so a term has no single position"
             )
 
+    def _execute_n_tn(self, token: Token, parser: Parser, value: Union[int, float]) -> Union[int, float]:
+        if not self.geometric:
+            return self.t + (value - 1) * self.d
+
+        self._check_exponent(token, parser, value)
+        return self.t * (self.d ** (value - 1))
+
+    def _execute_tn_n(self, token: Token, parser: Parser, value: Union[int, float]) -> Union[int, float]:
+        self._check_positions(token, parser)
+        if not self.geometric:
+            return (value - self.t) / self.d + 1
+
+        return (math.log(value / self.t) / math.log(self.d)) + 1
+
+    def _execute_n_sm(self, token: Token, parser: Parser, value: Union[int, float]) -> Union[int, float]:
+        if not self.geometric:
+            return value * (2 * self.t + (value - 1) * self.d) / 2
+
+        self._check_exponent(token, parser, value)
+        if self.d == 1:
+            return self.t * value
+
         return (self.t * ((self.d ** value) - 1)) / (self.d - 1)
 
-    def _execute_tn_sm(self, _: Token, __: Parser, value: Union[int, float]) -> Union[int, float]:
+    def _execute_tn_sm(self, token: Token, parser: Parser, value: Union[int, float]) -> Union[int, float]:
+        if not self.geometric:
+            return self._execute_tn_n(token, parser, value) * (self.t + value) / 2 # checks the positions
+
+        self._check_positions(token, parser)
         return (self.d*value-self.t)/(self.d-1)
 
     _EXECUTIONS = {
@@ -553,57 +679,83 @@ class GeoSequence:
     }
 
 class Function:
-    __slots__ = "name", "args", "chunks"
+    __slots__ = "name", "args", "body", "_program"
     value = None
     plot = False
 
-    def __init__(self, name: str, args: List[str], chunks: List[Union[Bracket, Token, Operator]]):
+    def __init__(self, name: str, args: List[str], body: Optional[Node]):
         self.name = name
         self.args = args
-        self.chunks = chunks
+        self.body = body
+        self._program = None
 
     def validate(self, parser: Parser):
-        def validate_chunk(_chunk):
-            if isinstance(_chunk, Bracket):
-                for c in _chunk.tokens:
-                    validate_chunk(c)
+        parser.validate_node(self.body, self.args)
 
-            elif isinstance(_chunk, Token):
-                if _chunk.type == "NAME":
-                    if _chunk.value not in self.args and _chunk.value not in parser.state:
-                        raise TokenizedUserInputError(parser.input, _chunk, f"Unknown variable: '{_chunk.value}'")
+    def optimize(self, parser: Parser):
+        self.body = optimize_node(parser, self.body, self.args)
+        self._program = None
 
-        for chunk in self.chunks:
-            validate_chunk(chunk)
-
-    def plots(self, parser: Parser):
+    def plots(self, parser: Parser, vectorized: bool=False, options: PlotOptions=None):
         """
-        Returns a dict of x:y coordinates
+        Returns a dict of x:y coordinates, sampled according to ``options`` (or the parser's plot options).
+        Points that can't be evaluated (division by 0, numbers that are too large, math domain errors) are None,
+        while going over the parser's budget (a :class:`LimitError`) stops plotting.
+        With ``vectorized``, every point is evaluated at once with numpy (see :mod:`mathparser.vector`).
+        Adaptive sampling always evaluates point by point.
         """
-        scope = {"x": 0}
-        plots = {}
+        options = options or parser.plot_options
+        program = self.compile(parser)
+        frame = program.make_frame(parser, {"x": 0})
+        slot = program.slots.index("x")
 
-        for x in range(-5, 6):
-            scope['x'] = x
+        def evaluate(x):
+            frame[slot] = x
             try:
-                y = parser.do_math(self.chunks, scope)
-            except ZeroDivisionError:
-                y = None
-            plots[x] = y
+                return program.run(parser, frame)
+            except LimitError:
+                raise
+            except INPUT_ERRORS:
+                return None
+
+        if options.adaptive:
+            return adaptive_points(evaluate, options)
+
+        if vectorized:
+            from .vector import plot_points
+            return plot_points(self, parser, options.points())
+
+        return {x: evaluate(x) for x in options.points()}
+
+    def compile(self, parser: Parser) -> "Program":
+        if self._program is None:
+            self._program = compile_node(parser, self.body, self.args)
 
-        return plots
+        return self._program
 
     def execute(self, _: Token, parser: Parser, scope: dict=None):
-        return parser.do_math(self.chunks, scope)
+        return self.compile(parser).execute(parser, scope)
+
+    def call(self, token: Token, parser: Parser, values: List[Union[int, float]]):
+        """
+        Runs the function with its arguments in order. The program's slots are the function's parameters,
+        so ``values`` is used as the frame as-is, without building a dict per call.
+        """
+        return self.compile(parser).run(parser, values)
 
     def __repr__(self):
-        return f"<Function name={self.name} args={self.args} chunks={self.chunks}"
+        return f"<Function name={self.name} args={self.args} body={self.body!r}>"
 
 class PlottableFunction(Function):
     plot = True
+    vectorized = False
+    options: Optional[PlotOptions] = None # falls back to Parser.plot_options
 
     def execute(self, _: Token, parser: Parser, scope: dict=None):
-        return self.plots(parser)
+        if parser.collector is not None:
+            return parser.measure_evaluation(self.plots, parser, self.vectorized, self.options)
+
+        return self.plots(parser, self.vectorized, self.options)
 
 class SequenceFunction(Function):
     __slots__ = "sequence",
@@ -611,7 +763,7 @@ class SequenceFunction(Function):
     def __init__(self, sequence: GeoSequence): # noqa
         self.name = "S"
         self.args = ["value"]
-        self.chunks = None
+        self.body = None
         self.sequence = sequence
 
     def validate(self, parser: Parser):
@@ -623,78 +775,37 @@ class SequenceFunction(Function):
 
         return self.sequence.execute(token, parser, scope['value'])
 
+    def call(self, token: Token, parser: Parser, values: List[Union[int, float]]):
+        return self.sequence.execute(token, parser, values[0])
+
 class BuiltinFunction(Function):
     def __init__(self, name: str, args: List[str], callback: Callable): # noqa
         self.name = name
         self.args = args
-        self.chunks = callback
+        self.body = None
+        self.callback = callback
 
     def validate(self, parser: Parser):
         pass
 
     def execute(self, token: Token, parser: Parser, scope: dict=None):
+        return self.call(token, parser, [scope[name] for name in self.args])
+
+    def call(self, token: Token, parser: Parser, values: List[Union[int, float]]):
         try:
-            return self.chunks(parser, **scope)
+            return self.callback(parser, *values)
         except ZeroDivisionError:
+            if token is None: # called directly, such as by evaluate_many, rather than from the input
+                raise UserInputError("Division by 0")
+
             raise TokenizedUserInputError(parser.input, token, "Division by 0")
 
     def __repr__(self):
         return f"<BuiltinFunction name={self.name} args={self.args}>"
 
 
-class FunctionCall:
-    __slots__ = "_start", "name", "args"
-    value = None
-    type = None
-
-    def __init__(self, t: Token, name: str, tokens: List[Union[Expression, "FunctionCall", Token]]):
-        self._start = t
-        self.name = name
-        self.args = tokens
-
-    def validate(self, parser: Parser, scope: dict=None):
-        if self.name not in parser.state:
-            raise TokenizedUserInputError(parser.input, self._start, f"Function '{self.name}' not found")
-
-        func = parser.state[self.name]
-
-        if len(func.args) != len(self.args):
-            logger.debug(str((self.args, func.args)))
-            raise TokenizedUserInputError(
-                parser.input,
-                self._start,
-                f"{'Not enough' if len(func.args)>len(self.args) else 'Too many'} arguments passed to {self.name}"
-            )
-
-        for arg in self.args:
-            if isinstance(arg, (str, int)):
-                if not scope and arg not in parser.state:
-                    raise TokenizedUserInputError(parser.input, self._start, f"Variable '{arg}' not found")
-
-                elif scope and arg not in scope and arg not in parser.state:
-                    raise TokenizedUserInputError(parser.input, self._start, f"Variable '{arg}' not found")
-
-            elif isinstance(arg, FunctionCall):
-                arg.validate(parser, scope)
-
-    def execute(self, parser: Parser, scope: dict=None):
-        func = parser.state[self.name] # it should already be there, we validated earlier
-        if not isinstance(func, Function):
-            raise ValueError("function expected. todo: this errror") # TODO
-
-        args = {}
-        for index, arg in enumerate(self.args):
-            if isinstance(arg, Expression):
-                args[func.args[index]] = parser.do_math(arg.chunks, scope)
-            else:
-                try:
-                    args[func.args[index]] = arg.execute(parser, scope)
-                except AttributeError:
-                    if arg.type == "NAME":
-                        args[func.args[index]] = parser.get_var_with_state(arg, scope)
-                    else:
-                        args[func.args[index]] = arg.value
-
-        return func.execute(self._start, parser, args)
+from .grammar import iter_statements # noqa: E402 (circular)
+from .compiler import compile_node, Program # noqa: E402
+from .optimize import optimize as optimize_node # noqa: E402
 
 BUILTINS = Builtins()
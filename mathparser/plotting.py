@@ -0,0 +1,100 @@
+import heapq
+import math
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+__all__ = "PlotOptions", "adaptive_points"
+
+Number = Union[int, float]
+
+
+class PlotOptions:
+    """
+    Controls where and how densely graphed functions are sampled.
+
+    ``domain`` is the (start, stop) range of x values, inclusive. ``samples`` is the number of evenly spaced points.
+    With ``adaptive``, those points are only the starting grid: intervals where the curve bends or breaks are
+    subdivided until ``max_points`` evaluations have been spent, or every interval is within ``tolerance``
+    (a fraction of the sampled y range) of a straight line.
+    """
+    __slots__ = "domain", "samples", "adaptive", "max_points", "tolerance"
+
+    def __init__(
+            self,
+            domain: Tuple[Number, Number]=(-5, 5),
+            samples: int=11,
+            adaptive: bool=False,
+            max_points: int=500,
+            tolerance: float=0.005
+    ):
+        start, stop = domain
+        if stop < start:
+            raise ValueError("domain must be given as (start, stop) with start <= stop")
+        if samples < 1:
+            raise ValueError("samples must be at least 1")
+        if adaptive and max_points < samples:
+            raise ValueError("max_points must be at least samples")
+
+        self.domain = (start, stop)
+        self.samples = samples
+        self.adaptive = adaptive
+        self.max_points = max_points
+        self.tolerance = tolerance
+
+    def __repr__(self):
+        return f"<PlotOptions domain={self.domain} samples={self.samples} adaptive={self.adaptive}>"
+
+    def points(self) -> List[Number]:
+        """
+        The evenly spaced x values. Integer domains with whole steps produce ints.
+        """
+        start, stop = self.domain
+        if self.samples == 1 or start == stop:
+            return [start]
+
+        step = (stop - start) / (self.samples - 1)
+        if isinstance(start, int) and isinstance(stop, int) and step.is_integer():
+            step = int(step)
+
+        return [start + step * i for i in range(self.samples - 1)] + [stop]
+
+
+def adaptive_points(evaluate: Callable[[Number], Optional[Number]], options: PlotOptions) -> Dict[Number, Optional[Number]]:
+    """
+    Samples ``evaluate`` on the options' grid, then refines the worst intervals first.
+    ``evaluate`` returns None for points that can't be plotted.
+    """
+    plots = {x: evaluate(x) for x in options.points()}
+    xs = list(plots)
+
+    finite = [y for y in plots.values() if y is not None]
+    scale = (max(finite) - min(finite)) if finite else 0
+    scale = scale or 1
+    min_width = (options.domain[1] - options.domain[0]) * 1e-6
+    heap = []
+
+    def refine(x0: Number, x1: Number):
+        if len(plots) >= options.max_points or x1 - x0 <= min_width:
+            return
+
+        xm = (x0 + x1) / 2
+        ym = plots[xm] = evaluate(xm)
+        y0, y1 = plots[x0], plots[x1]
+
+        if y0 is None or y1 is None or ym is None:
+            # an edge of the function's domain, or a discontinuity. keep narrowing it down
+            error = 0 if y0 is None and y1 is None and ym is None else math.inf
+        else:
+            error = abs(ym - (y0 + y1) / 2) / scale
+
+        if error > options.tolerance:
+            heapq.heappush(heap, (-error, x0, xm, x1))
+
+    for x0, x1 in zip(xs, xs[1:]):
+        refine(x0, x1)
+
+    while heap and len(plots) < options.max_points:
+        _, x0, xm, x1 = heapq.heappop(heap)
+        refine(x0, xm)
+        refine(xm, x1)
+
+    return dict(sorted(plots.items()))
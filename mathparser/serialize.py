@@ -0,0 +1,519 @@
+"""
+A compact, versioned binary format for parsed programs, so they can be parsed once and shared between processes
+(through a file, a shared cache or shared memory). Loading only ever builds mathparser's own objects from plain
+numbers and strings, every count and index in the data is checked against what was actually read, plot options
+are capped at :data:`MAX_PLOT_POINTS`, and the loaded program is validated again, so unlike pickle it's safe
+for untrusted data.
+
+    data = serialize.dumps(parser, exprs)
+    parser, exprs = serialize.loads(data)
+
+Every parser option (memo, budget, collector...) belongs to the process that loads the program, and is given to
+:func:`loads`. Builtins aren't stored, and neither is a function :meth:`Parser.define` was given directly
+(such as a :class:`~mathparser.parse.BuiltinFunction`); pass those to :func:`loads` as ``definitions``.
+Any other value that isn't a number can't be stored, and :func:`dumps` raises ValueError for it.
+"""
+import struct
+import sys
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .lex import MathLexer
+from .nodes import *
+from .parse import (
+    Parser,
+    Operator,
+    Expression,
+    Function,
+    PlottableFunction,
+    SequenceFunction,
+    GeoSequence
+)
+from .plotting import PlotOptions
+from .tokens import Token
+
+__all__ = "FORMAT_VERSION", "MAX_PLOT_POINTS", "dumps", "loads"
+
+MAGIC = b"MPRG"
+FORMAT_VERSION = 2
+# versions this one can still read. version 1 had no arithmetic sequences
+_READABLE_VERSIONS = (1, 2)
+# the most points a loaded graph may be sampled at (samples and max_points), so the data can't decide how much work plotting is
+MAX_PLOT_POINTS = 1_000_000
+
+# number tags
+_INT = 0
+_FLOAT = 1
+_NONE = 2
+
+# token value tags
+_STR_VALUE = 0
+_FLOAT_VALUE = 1
+
+# definition tags
+_NUMBER_DEF = 0
+_FUNCTION_DEF = 1
+_SEQUENCE_DEF = 2
+
+# expression tags
+_EXPRESSION = 0
+_PLOT = 1
+
+# tree ops, in post-order
+_NUM = 0
+_VAR = 1
+_NEG = 2
+_BINOP = 3
+_CALL = 4
+_SEQCALL = 5
+_HOIST = 6
+_HOIST_REF = 7
+
+_DOUBLE = struct.Struct("<d")
+# the function types that are stored. any other function in the state came from Parser.define
+_STORED = (Function, SequenceFunction)
+
+
+class _Writer:
+    __slots__ = "out", "strings", "tokens", "token_ids"
+
+    def __init__(self):
+        self.out = bytearray()
+        self.strings: Dict[str, int] = {}
+        self.tokens: List[Token] = []
+        self.token_ids: Dict[int, int] = {}
+
+    def uint(self, n: int):
+        out = self.out
+        while n > 0x7f:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+
+        out.append(n)
+
+    def intern(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+
+        return index
+
+    def string(self, s: str):
+        self.uint(self.intern(s))
+
+    def token(self, tok: Token):
+        index = self.token_ids.get(id(tok))
+        if index is None:
+            index = self.token_ids[id(tok)] = len(self.tokens)
+            self.tokens.append(tok)
+
+        self.uint(index)
+
+    def number(self, n: Optional[Union[int, float]]):
+        if n is None:
+            self.out.append(_NONE)
+        elif isinstance(n, int):
+            self.out.append(_INT)
+            self.uint(n << 1 if n >= 0 else ((-n) << 1) - 1)
+        else:
+            self.out.append(_FLOAT)
+            self.out += _DOUBLE.pack(n)
+
+    def tree(self, root: Node):
+        # an explicit post-order walk, like the compiler's, so deeply nested input can't hit the recursion limit
+        ops = 0
+        start = len(self.out)
+        todo: List[Tuple[Node, bool]] = [(root, False)]
+        while todo:
+            node, visited = todo.pop()
+            if isinstance(node, Hoisted) and not node.first:
+                self.out.append(_HOIST_REF)
+                self.uint(node.index)
+
+            elif isinstance(node, (Num, Var)) or visited:
+                self.node(node)
+
+            else:
+                todo.append((node, True))
+                todo.extend((child, False) for child in reversed(node.children()))
+                continue
+
+            ops += 1
+
+        # the op count goes in front, so the reader knows where the tree ends
+        body = self.out[start:]
+        del self.out[start:]
+        self.uint(ops)
+        self.out += body
+
+    def node(self, node: Node):
+        out = self.out
+        if isinstance(node, Num):
+            out.append(_NUM)
+            self.token(node.token)
+            self.number(node.value)
+        elif isinstance(node, Var):
+            out.append(_VAR)
+            self.token(node.token)
+        elif isinstance(node, Neg):
+            out.append(_NEG)
+            self.token(node.token)
+        elif isinstance(node, BinOp):
+            out.append(_BINOP)
+            self.token(node.op.token)
+        elif isinstance(node, Call):
+            out.append(_SEQCALL if isinstance(node, SeqCall) else _CALL)
+            self.token(node.token)
+            self.string(node.name)
+            self.uint(len(node.args))
+        elif isinstance(node, Hoisted):
+            out.append(_HOIST)
+            self.uint(node.index)
+        else:
+            raise ValueError(f"Unable to serialize {node!r}")
+
+    def strs(self, values: List[str]):
+        self.uint(len(values))
+        for s in values:
+            self.string(s)
+
+    def options(self, options: Optional[PlotOptions]):
+        if options is None:
+            self.out.append(0)
+            return
+
+        self.out.append(1)
+        self.number(options.domain[0])
+        self.number(options.domain[1])
+        self.uint(options.samples)
+        self.out.append(options.adaptive)
+        self.uint(options.max_points)
+        self.number(options.tolerance)
+
+
+class _Reader:
+    __slots__ = "data", "pos", "strings", "tokens"
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+        self.strings: List[str] = []
+        self.tokens: List[Token] = []
+
+    def byte(self) -> int:
+        pos = self.pos
+        if pos >= len(self.data):
+            raise ValueError("Truncated program")
+
+        self.pos = pos + 1
+        return self.data[pos]
+
+    def uint(self) -> int:
+        n = shift = 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                return n
+
+            shift += 7
+
+    def raw(self, size: int) -> bytes:
+        pos = self.pos
+        if pos + size > len(self.data):
+            raise ValueError("Truncated program")
+
+        self.pos = pos + size
+        return self.data[pos:pos + size]
+
+    def _index(self, table: list, what: str):
+        i = self.uint()
+        if i >= len(table):
+            raise ValueError(f"Invalid {what} reference")
+
+        return table[i]
+
+    def string(self) -> str:
+        return self._index(self.strings, "string")
+
+    def token(self) -> Token:
+        return self._index(self.tokens, "token")
+
+    def number(self) -> Optional[Union[int, float]]:
+        tag = self.byte()
+        if tag == _INT:
+            n = self.uint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+        elif tag == _FLOAT:
+            return _DOUBLE.unpack(self.raw(8))[0]
+        elif tag == _NONE:
+            return None
+
+        raise ValueError("Invalid number")
+
+    def tree(self) -> Node:
+        stack: List[Node] = []
+        temps: Dict[int, Node] = {}
+
+        def pop(n: int) -> List[Node]:
+            if n > len(stack):
+                raise ValueError("Invalid expression")
+
+            args = stack[len(stack) - n:]
+            del stack[len(stack) - n:]
+            return args
+
+        size = self.uint()
+        for _ in range(size):
+            op = self.byte()
+            if op == _NUM:
+                tok = self.token()
+                stack.append(Num(tok, self.number()))
+            elif op == _VAR:
+                stack.append(Var(self.token()))
+            elif op == _NEG:
+                tok = self.token()
+                stack.append(Neg(tok, pop(1)[0]))
+            elif op == _BINOP:
+                tok = self.token()
+                if tok.value not in Operator.OPS:
+                    raise ValueError(f"Invalid operator: {tok.value!r}")
+
+                left, right = pop(2)
+                stack.append(BinOp(Operator(tok), left, right))
+            elif op == _CALL or op == _SEQCALL:
+                tok = self.token()
+                name = self.string()
+                args = pop(self.uint())
+                stack.append((SeqCall if op == _SEQCALL else Call)(tok, name, args))
+            elif op == _HOIST:
+                index = self.uint()
+                if index >= size or index in temps:
+                    raise ValueError("Invalid expression")
+
+                node = temps[index] = pop(1)[0]
+                stack.append(Hoisted(node, index, True))
+            elif op == _HOIST_REF:
+                index = self.uint()
+                if index not in temps:
+                    raise ValueError("Invalid expression")
+
+                stack.append(Hoisted(temps[index], index, False))
+            else:
+                raise ValueError(f"Unknown op {op}")
+
+        # the compiler allocates a register for every index up to the largest, so they must be 0..n-1
+        if len(stack) != 1 or (temps and max(temps) != len(temps) - 1):
+            raise ValueError("Invalid expression")
+
+        return stack[0]
+
+    def strs(self) -> List[str]:
+        return [self.string() for _ in range(self.uint())]
+
+    def options(self) -> Optional[PlotOptions]:
+        if not self.byte():
+            return None
+
+        start, stop = self.number(), self.number()
+        samples = self.uint()
+        adaptive = bool(self.byte())
+        max_points = self.uint()
+        tolerance = self.number()
+        for n in (start, stop, tolerance):
+            # also rejects nan and infinities, and ints too large to become floats
+            if n is None or not -sys.float_info.max <= n <= sys.float_info.max:
+                raise ValueError("Invalid plot options")
+
+        if samples > MAX_PLOT_POINTS or max_points > MAX_PLOT_POINTS or tolerance < 0:
+            raise ValueError("Invalid plot options")
+
+        return PlotOptions((start, stop), samples, adaptive, max_points, tolerance)
+
+
+def dumps(parser: Parser, exprs: List[Union[Expression, PlottableFunction]]) -> bytes:
+    """
+    Serializes a parsed (and validated) program: the parser's input, tokens, definitions and sequence,
+    and the expressions :meth:`Parser.parse` returned.
+    """
+    w = _Writer()
+    w.string(parser.input)
+
+    tokens = parser.tokens or []
+    w.uint(len(tokens))
+    for tok in tokens:
+        w.token(tok)
+
+    seq = parser.sequence
+    w.out.append(seq is not None)
+    if seq is not None:
+        w.token(seq.token)
+        w.uint(len(seq.values))
+        for node in seq.values:
+            w.tree(node)
+
+        w.number(seq.t)
+        w.number(seq.d)
+        w.out.append(seq.geometric)
+
+    # functions given to Parser.define belong to the process, like builtins, so the loading process defines them again
+    state = {
+        name: value for name, value in parser.state.items()
+        if type(value) in _STORED or not isinstance(value, Function)
+    }
+    w.uint(len(state))
+    for name, value in state.items():
+        w.string(name)
+        if isinstance(value, SequenceFunction):
+            if value.sequence is not seq:
+                raise ValueError(f"Unable to serialize '{name}', it isn't the parser's sequence")
+
+            w.out.append(_SEQUENCE_DEF)
+        elif type(value) is Function:
+            w.out.append(_FUNCTION_DEF)
+            w.strs(value.args)
+            w.tree(value.body)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            w.out.append(_NUMBER_DEF)
+            w.number(value)
+        else:
+            raise ValueError(f"Unable to serialize '{name}' ({type(value).__name__})")
+
+    w.uint(len(exprs))
+    for expr in exprs:
+        if isinstance(expr, PlottableFunction):
+            w.out.append(_PLOT)
+            w.string(expr.name)
+            w.strs(expr.args)
+            w.tree(expr.body)
+            w.out.append(expr.vectorized)
+            w.options(expr.options)
+        else:
+            w.out.append(_EXPRESSION)
+            w.tree(expr.node)
+
+    w.uint(parser.state_version)
+
+    # the string and token tables go in front of the body, since reading the body needs them.
+    # token strings are interned first, so the string table is complete when it's written
+    token_strings = []
+    for tok in w.tokens:
+        # groups are stored as their text, which is all that errors show of them
+        value = None if isinstance(tok.value, float) else w.intern(str(tok.value))
+        token_strings.append((w.intern(tok.type), value))
+
+    head = _Writer()
+    head.out += MAGIC
+    head.out.append(FORMAT_VERSION)
+    head.uint(len(w.strings))
+    for s in w.strings: # dicts keep insertion order, which is index order
+        encoded = s.encode()
+        head.uint(len(encoded))
+        head.out += encoded
+
+    head.uint(len(w.tokens))
+    for tok, (type_, value) in zip(w.tokens, token_strings):
+        head.uint(type_)
+        if value is None:
+            head.out.append(_FLOAT_VALUE)
+            head.out += _DOUBLE.pack(tok.value)
+        else:
+            head.out.append(_STR_VALUE)
+            head.uint(value)
+
+        head.uint(tok.lineno)
+        head.uint(tok.index)
+        head.uint(tok.end)
+
+    head.out += w.out
+    return bytes(head.out)
+
+
+def loads(
+        data: bytes,
+        lex: MathLexer=None,
+        definitions: Dict[str, Any]=None,
+        **parser_options
+) -> Tuple[Parser, List[Union[Expression, PlottableFunction]]]:
+    """
+    Loads a program written by :func:`dumps`, returning a new parser and its expressions as :meth:`Parser.parse` would.
+    ``definitions`` are given to :meth:`Parser.define` before the program's own, for functions that weren't stored.
+    Extra keyword arguments are passed to the :class:`Parser`. Raises ValueError if ``data`` isn't a program
+    this version can read, and :class:`UserInputError` if it doesn't validate.
+    """
+    r = _Reader(memoryview(data))
+    if bytes(r.raw(len(MAGIC))) != MAGIC:
+        raise ValueError("Not a mathparser program")
+
+    version = r.byte()
+    if version not in _READABLE_VERSIONS:
+        raise ValueError(f"Unsupported program version {version} (expected {FORMAT_VERSION})")
+
+    try:
+        r.strings = [str(r.raw(r.uint()), "utf-8") for _ in range(r.uint())]
+    except UnicodeDecodeError:
+        raise ValueError("Invalid string") from None
+
+    for _ in range(r.uint()):
+        type_ = r.string()
+        if r.byte() == _FLOAT_VALUE:
+            value = _DOUBLE.unpack(r.raw(8))[0]
+        else:
+            value = r.string()
+
+        r.tokens.append(Token(type_, value, r.uint(), r.uint(), r.uint()))
+
+    parser = Parser(r.string(), lex or MathLexer(), **parser_options)
+    for name, value in (definitions or {}).items():
+        parser.define(name, value)
+
+    parser.tokens = [r.token() for _ in range(r.uint())]
+
+    if r.byte():
+        seq = parser.sequence = GeoSequence(r.token(), [r.tree() for _ in range(r.uint())])
+        seq.t = r.number()
+        seq.d = r.number()
+        seq.geometric = bool(r.byte()) if version > 1 else True
+
+    for _ in range(r.uint()):
+        name = r.string()
+        tag = r.byte()
+        if tag == _SEQUENCE_DEF:
+            if parser.sequence is None:
+                raise ValueError("Invalid sequence reference")
+
+            parser.state[name] = SequenceFunction(parser.sequence)
+        elif tag == _FUNCTION_DEF:
+            parser.state[name] = Function(name, r.strs(), r.tree())
+        elif tag == _NUMBER_DEF:
+            parser.state[name] = r.number()
+        else:
+            raise ValueError(f"Unknown definition type {tag}")
+
+    exprs: List[Union[Expression, PlottableFunction]] = []
+    for _ in range(r.uint()):
+        tag = r.byte()
+        if tag == _PLOT:
+            plot = PlottableFunction(r.string(), r.strs(), r.tree())
+            if r.byte():
+                plot.vectorized = True
+
+            plot.options = r.options()
+            exprs.append(plot)
+        elif tag == _EXPRESSION:
+            exprs.append(Expression(r.tree()))
+        else:
+            raise ValueError(f"Unknown expression type {tag}")
+
+    r.uint() # versions are only unique within the process that wrote them, so the parser keeps its own
+    if r.pos != len(r.data):
+        raise ValueError("Unexpected data after the program")
+
+    # cheap next to parsing, and it means nothing in the data can refer to something that doesn't exist
+    for value in parser.state.values():
+        if isinstance(value, Function):
+            value.validate(parser)
+
+    for expr in exprs:
+        expr.validate(parser)
+
+    return parser, exprs
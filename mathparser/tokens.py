@@ -0,0 +1,40 @@
+"""
+The token type used everywhere after lexing.
+"""
+from typing import Any, List, Optional
+from sly import lex
+
+__all__ = "Token", "find_token"
+
+
+class Token(lex.Token):
+    """
+    A lexed token. ``index`` and ``end`` are its span in the input, and ``lineno`` the line it starts on.
+    Tokens compare by identity; use :func:`find_token` to locate one in a token list by position.
+
+    It adds no slots to sly's token, so a token from sly can become one by assigning its ``__class__``.
+    """
+    __slots__ = ()
+
+    def __init__(self, type_: str, value: Any, lineno: int, index: int, end: int):
+        self.type = type_
+        self.value = value
+        self.lineno = lineno
+        self.index = index
+        self.end = end
+
+    def __reduce__(self):
+        return Token, (self.type, self.value, self.lineno, self.index, self.end)
+
+
+def find_token(tokens: List[Token], token: Token) -> Optional[int]:
+    """
+    Returns the position in ``tokens`` of the token starting where ``token`` does, or None.
+    Tokens made up by the parser (such as implicit multiplications) are found by the token they were made from.
+    """
+    index = token.index
+    for i, tok in enumerate(tokens):
+        if tok.index == index:
+            return i
+
+    return None
@@ -0,0 +1,291 @@
+"""
+Vectorized evaluation of compiled programs over NumPy arrays.
+This module requires numpy, which is an optional dependency (``pip install mathparser[numpy]``).
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+try:
+    import numpy
+except ImportError: # pragma: no cover
+    numpy = None
+
+from .errors import *
+from .compiler import Program, LOAD_CONST, LOAD_SLOT, LOAD_NAME, BINARY, NEGATE, STORE_TEMP, LOAD_TEMP
+from .parse import (
+    Parser,
+    Function,
+    BuiltinFunction,
+    GeoSequence,
+    MAX_ALLOWABLE_NUMBER,
+    MAX_EXPONENT
+)
+
+__all__ = (
+    "evaluate_program",
+    "evaluate_function",
+    "evaluate_rows",
+    "plot_points",
+    "SEQUENCE_QUERIES",
+    "evaluate_sequence",
+    "sequence_table"
+)
+
+if numpy is not None:
+    UFUNCS = {
+        "+": numpy.add,
+        "-": numpy.subtract,
+        "*": numpy.multiply,
+        "/": numpy.divide,
+        "^": numpy.power,
+    }
+
+    BUILTINS = {
+        "rad": numpy.radians,
+        "sin": numpy.sin,
+        "cos": numpy.cos,
+        "tan": numpy.tan,
+        "asin": lambda x, y: numpy.arcsin(x / y),
+        "acos": lambda x, y: numpy.arccos(x / y),
+        "atan": lambda x, y: numpy.arctan(x / y),
+        "log": numpy.log,
+    }
+else: # pragma: no cover
+    UFUNCS = BUILTINS = {}
+
+
+def _require_numpy():
+    if numpy is None:
+        raise RuntimeError("numpy is required for vectorized evaluation")
+
+
+class _VectorRun:
+    __slots__ = "parser", "invalid"
+
+    def __init__(self, parser: Parser, shape: tuple):
+        self.parser = parser
+        self.invalid = numpy.zeros(shape, dtype=bool)
+
+    def run(self, program: Program, frame: Sequence):
+        if self.parser.budget is not None:
+            # every operation runs once per point
+            size = self.invalid.size
+            self.parser.budget.charge(len(program.code) * size, (program.depth + program.temps) * size)
+
+        stack = [None] * program.depth
+        temps = [None] * program.temps
+        sp = 0
+
+        for code, arg in program.code:
+            if code == LOAD_CONST:
+                stack[sp] = arg
+                sp += 1
+            elif code == LOAD_SLOT:
+                stack[sp] = frame[arg]
+                sp += 1
+            elif code == BINARY:
+                sp -= 1
+                stack[sp-1] = self.binary(arg.op, stack[sp-1], stack[sp])
+            elif code == LOAD_NAME:
+                stack[sp] = self.parser.get_var_with_state(arg)
+                sp += 1
+            elif code == NEGATE:
+                stack[sp-1] = -stack[sp-1]
+            elif code == STORE_TEMP:
+                temps[arg] = stack[sp-1]
+            elif code == LOAD_TEMP:
+                stack[sp] = temps[arg]
+                sp += 1
+            else: # CALL
+                call, argc = arg
+                sp -= argc
+                stack[sp] = self.call(call, stack[sp:sp+argc])
+                sp += 1
+
+        return stack[0]
+
+    def binary(self, op: str, left, right):
+        # the same limits Operator.execute enforces, applied per point
+        invalid = self.invalid
+        invalid |= left > MAX_ALLOWABLE_NUMBER
+        invalid |= right > MAX_ALLOWABLE_NUMBER
+        if op == "^":
+            invalid |= right > MAX_EXPONENT
+        elif op == "/":
+            invalid |= right == 0
+
+        return UFUNCS[op](left, right)
+
+    def call(self, call, args: List):
+        func = self.parser.resolve_call(call, len(args))
+        if isinstance(func, BuiltinFunction):
+            if func.name in BUILTINS:
+                if len(args) == 2:
+                    # asin/acos/atan divide their arguments, and raise "Division by 0" when scalar
+                    invalid = self.invalid
+                    invalid |= numpy.asarray(args[1]) == 0
+
+                return BUILTINS[func.name](*args)
+
+        elif isinstance(func, Function) and func.body is not None:
+            return self.run(func.compile(self.parser), args)
+
+        return self.elementwise(call, args)
+
+    def elementwise(self, call, args: List):
+        # anything without a vectorized form (sequences, unknown builtins) is evaluated one point at a time
+        invalid = self.invalid
+        arrays = numpy.broadcast_arrays(*[numpy.asarray(a, dtype=float) for a in args], invalid)[:-1]
+        out = numpy.full(invalid.shape, numpy.nan)
+
+        for index in numpy.ndindex(invalid.shape):
+            if invalid[index]:
+                continue
+
+            try:
+                out[index] = self.parser.call(call, [float(a[index]) for a in arrays])
+            except LimitError:
+                raise
+            except INPUT_ERRORS:
+                invalid[index] = True
+
+        return out
+
+
+def evaluate_program(
+        program: Program,
+        parser: Parser,
+        frame: Sequence[Union[int, float, "numpy.ndarray"]],
+        shape: Optional[tuple]=None
+) -> "numpy.ma.MaskedArray":
+    """
+    Runs a program with array-valued slots. Points that would have raised (division by 0, limit violations,
+    math domain errors) are masked instead.
+    """
+    _require_numpy()
+    if shape is None:
+        shape = numpy.broadcast(*[numpy.asarray(x) for x in frame]).shape if frame else ()
+
+    runner = _VectorRun(parser, shape)
+    with numpy.errstate(all="ignore"):
+        result = numpy.broadcast_to(numpy.asarray(runner.run(program, frame), dtype=float), shape)
+        invalid = runner.invalid | ~numpy.isfinite(result)
+
+    return numpy.ma.masked_array(result, mask=invalid)
+
+
+def evaluate_function(function: Function, parser: Parser, xs: Iterable[Union[int, float]], var: str="x") -> "numpy.ma.MaskedArray":
+    """
+    Evaluates a single-variable function over every value in ``xs`` at once.
+    """
+    _require_numpy()
+    xs = numpy.asarray(xs, dtype=float)
+    program = function.compile(parser)
+    frame = program.make_frame(parser, {var: 0})
+    frame[program.slots.index(var)] = xs
+    return evaluate_program(program, parser, frame, xs.shape)
+
+
+def evaluate_rows(function: Function, parser: Parser, rows: Any, errors: str="raise") -> "numpy.ndarray":
+    """
+    The vectorized form of :meth:`Parser.evaluate_many`. ``rows`` is anything numpy can turn into a 2d array
+    with one column per argument (or a 1d array, for single argument functions).
+    """
+    _require_numpy()
+    columns = numpy.asarray(rows, dtype=float)
+    argc = len(function.args)
+    if columns.ndim == 1 and argc == 1:
+        columns = columns[:, None]
+
+    if columns.ndim != 2 or columns.shape[1] != argc:
+        raise ValueError(f"Expected {argc} arguments for {function.name}, got rows of shape {columns.shape}")
+
+    program = function.compile(parser)
+    result = evaluate_program(program, parser, [columns[:, i] for i in range(argc)], (len(columns),))
+
+    if errors == "raise":
+        for index in numpy.flatnonzero(result.mask):
+            # re-evaluating the row raises the same error the scalar path would
+            program.run(parser, columns[index].tolist())
+
+        return result.filled(numpy.nan)
+
+    elif errors == "skip":
+        return result.compressed()
+
+    return result.filled(numpy.nan)
+
+
+def plot_points(function: Function, parser: Parser, xs: Iterable[Union[int, float]]) -> Dict[Union[int, float], Optional[float]]:
+    """
+    Returns a dict of x:y coordinates, the same shape :meth:`Function.plots` returns. Invalid points are None.
+    """
+    _require_numpy()
+    xs = numpy.asarray(xs)
+    ys = evaluate_function(function, parser, xs)
+    return dict(zip(xs.tolist(), ys.tolist()))
+
+
+# the vectorized forms of S(n), S?(tn), S!(n) and S!!(tn)
+SEQUENCE_QUERIES = ("term", "position", "sum", "sum_to")
+
+
+def evaluate_sequence(sequence: GeoSequence, parser: Parser, query: str, values: Iterable[Union[int, float]]) -> "numpy.ma.MaskedArray":
+    """
+    Answers one of :data:`SEQUENCE_QUERIES` for every value at once: the ``term`` at each position ``n``,
+    the ``position`` of each term, the ``sum`` of the first ``n`` terms, or the sum of the terms up to each term
+    (``sum_to``). Values the scalar queries would reject (exponents over the limit, logs of negative numbers)
+    are masked. Positions of a constant sequence (ratio 1, or difference 0) don't exist,
+    and raise a :class:`UserInputError`.
+    """
+    _require_numpy()
+    if query not in SEQUENCE_QUERIES:
+        raise ValueError(f"Unknown sequence query '{query}'")
+
+    values = numpy.asarray(values, dtype=float)
+    if parser.budget is not None:
+        parser.budget.charge(values.size, values.size)
+
+    t, d = sequence.t, sequence.d
+    if sequence.constant and query in ("position", "sum_to"):
+        raise UserInputError(f"Every term of this sequence is {t}, so a term has no single position")
+
+    invalid = numpy.zeros(values.shape, dtype=bool)
+    with numpy.errstate(all="ignore"):
+        if not sequence.geometric:
+            if query == "term":
+                result = t + (values - 1) * d
+            elif query == "position":
+                result = (values - t) / d + 1
+            elif query == "sum":
+                result = values * (2 * t + (values - 1) * d) / 2
+            else:
+                result = ((values - t) / d + 1) * (t + values) / 2
+
+        elif query == "term":
+            invalid |= values > MAX_EXPONENT
+            result = t * numpy.power(d, values - 1)
+        elif query == "position":
+            result = numpy.log(values / t) / numpy.log(d) + 1
+        elif query == "sum":
+            invalid |= values > MAX_EXPONENT
+            result = t * values if d == 1 else t * (numpy.power(d, values) - 1) / (d - 1)
+        else:
+            result = (d * values - t) / (d - 1)
+
+        result = numpy.asarray(result, dtype=float)
+        invalid |= ~numpy.isfinite(result)
+
+    return numpy.ma.masked_array(result, mask=invalid)
+
+
+def sequence_table(sequence: GeoSequence, parser: Parser, terms: int) -> Dict[str, "numpy.ma.MaskedArray"]:
+    """
+    The first ``terms`` terms of a sequence, with their positions (``n``) and running totals (``sum``).
+    """
+    _require_numpy()
+    n = numpy.arange(1, terms + 1, dtype=float)
+    return {
+        "n": numpy.ma.masked_array(n),
+        "term": evaluate_sequence(sequence, parser, "term", n),
+        "sum": evaluate_sequence(sequence, parser, "sum", n),
+    }
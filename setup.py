@@ -23,6 +23,7 @@ setup(name='mathparser',
       long_description_content_type="text/markdown",
       include_package_data=True,
       install_requires=requirements,
+      extras_require={"numpy": ["numpy"]},
       python_requires='>=3.7.0',
       classifiers=[
         'Development Status :: 3 - Alpha',
@@ -0,0 +1,35 @@
+import mathparser
+from mathparser.bulk import _describe, _evaluate, _warm
+
+
+class _Unprintable(mathparser.UserInputError):
+    def __str__(self):
+        raise IndexError("broken traceback")
+
+
+def test_traceback_for_error_near_the_end():
+    # the error token is third from the end, so there's no token after the highlighted ones
+    _warm({}, {})
+    result = _evaluate("(2^60)")
+    assert result.error_type == "EvaluationError"
+    assert result.error.startswith(">( >>2.0 ^ 60.0<< ")
+
+
+def test_batch_keeps_going_after_an_error():
+    with mathparser.BulkEvaluator(workers=1) as evaluator:
+        results = evaluator.evaluate(["1+1", "(2^60)", "2+2"])
+
+    assert [r.values for r in results] == [[2.0], None, [4.0]]
+    assert results[1].error_type == "EvaluationError"
+    assert "larger than the permissible values" in results[1].error
+
+
+def test_unprintable_error_fails_only_its_input():
+    assert _describe(_Unprintable("the message")) == "the message"
+
+
+def test_recursion_fails_only_its_input():
+    _warm({}, {})
+    result = _evaluate("p(x)=p(x)+1\np(1)")
+    assert result.error_type == "RecursionError"
+    assert _evaluate("2+2").values == [4.0]
@@ -0,0 +1,33 @@
+import pytest
+
+import mathparser
+from mathparser import serialize
+from mathparser.parse import BuiltinFunction
+
+
+def _parse(user_input: str, parser: mathparser.Parser=None):
+    lex = mathparser.MathLexer()
+    parser = parser or mathparser.Parser(user_input, lex)
+    parser.input = user_input
+    return parser, parser.parse(list(lex.tokenize(user_input)))
+
+
+def test_defined_functions_are_given_to_loads():
+    double = BuiltinFunction("double", ["x"], lambda _, x: x * 2)
+    parser = mathparser.Parser("", mathparser.MathLexer())
+    parser.define("double", double)
+    parser, exprs = _parse("p(x)=double(x)+1\np(3)", parser)
+
+    data = serialize.dumps(parser, exprs)
+    with pytest.raises(mathparser.UserInputError):
+        serialize.loads(data)
+
+    loaded, exprs = serialize.loads(data, definitions={"double": double})
+    assert exprs[0].execute(None, loaded) == 7
+
+
+def test_values_that_cant_be_stored():
+    parser, exprs = _parse("1+1")
+    parser.define("name", "not a number")
+    with pytest.raises(ValueError):
+        serialize.dumps(parser, exprs)